@@ -1,11 +1,26 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import json
-import requests
+import threading
+import composite
+import figure_cache
+import figures
+import geo_simplify
+import geo_store
+import geography
+import history
+import ingest
+import pipeline
+import queries
+import rank_index
+import score_store
+import settings
+import similarity
+import telemetry
+import warmup
 
 # Page Configuration
 st.set_page_config(page_title="GeneSmart Dashboard", layout="wide", page_icon="🧬")
+telemetry.begin_run()
 
 # Custom CSS for "Premium Biotech" feel
 st.markdown("""
@@ -88,45 +103,186 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Data Loading & Preprocessing
-@st.cache_data
+@st.cache_resource
+def shared_score_store():
+    # Shared by all sessions; follows the score file on disk (see score_store.py)
+    return score_store.ScoreStore(settings.DATA_PATH)
+
 def load_data():
+    # Only stats the file on a normal rerun; appended rows are parsed alone
     try:
-        df = pd.read_csv("dataheatmap.csv", skiprows=1)
-        df.columns = [c.strip() for c in df.columns]
-        
-        # Name Normalization for matching GeoJSON
-        def normalize_name(name):
-            if not isinstance(name, str): return name
-            # Basic normalization: strip, title case, handle Gabès/Gabes
-            n = name.strip()
-            # Replace accents for matching if necessary, though gov_name_f usually has accents
-            # We'll keep it simple: just strip and ensure matching titles
-            return n
-
-        df['Location'] = df['Location'].apply(normalize_name)
-        
-        # Group by Location and sum
-        df_grouped = df.groupby('Location').sum().reset_index()
-        return df_grouped
+        store = shared_score_store()
+        store.refresh()
+        return store
     except Exception as e:
         st.error(f"Erreur lors du chargement des données CSV: {e}")
         return None
 
-@st.cache_data
-def load_geojson():
-    url = "https://raw.githubusercontent.com/mtimet/tnacmaps/master/geojson/governorates.geojson"
+@telemetry.counted("geojson", st.cache_data)
+def load_geojson(name, level, path=()):
+    # Served from the local geometry store; the network is only used on first run.
+    # The simplified level keeps the figure payload small (see geo_simplify.py).
+    # Finer administrative levels are only loaded when the user drills into them.
     try:
-        response = requests.get(url)
-        data = response.json()
-        return data
+        geojson = geo_simplify.load_level(name, level)
+        return geography.subset(geojson, len(path), path[-1] if path else None)
     except Exception as e:
         st.error(f"Erreur lors du chargement du GeoJSON: {e}")
         return None
 
-df = load_data()
-geojson = load_geojson()
+@telemetry.counted("geo_url", st.cache_data)
+def geo_url(name, level, path=()):
+    # Static URL of the geometry on screen (see geo_store.publish)
+    return geo_store.publish(load_geojson(name, level, path))
+
+@st.cache_resource
+def map_tables():
+    # (drill-down path, geometry level) -> (data version, MapTable), shared by all sessions
+    return {}
+
+def load_map_table(store, snapshot, geojson, level, path=()):
+    # Ratios, left join on every GeoJSON region and missing-data markers for
+    # all metrics at once, so switching metric is a column lookup. When the
+    # data changes, only the columns of the changed metrics are recomputed.
+    # `snapshot` is the store's data taken once for the rerun.
+    cached = map_tables().get((path, level))
+    if cached is not None and cached[0] == snapshot.version:
+        telemetry.count("map_table", "hit")
+        return cached[1]
+    key = geography.key(geography.LEVELS[len(path)])
+    data = geography.rollup(snapshot.finest, len(path), path) if path else snapshot.grouped
+    changed = store.changed_since(cached[0], snapshot.version) if cached is not None else None
+    if changed is None:
+        telemetry.count("map_table", "miss")
+        table = pipeline.build_map_table(data, geojson, key)
+    else:
+        telemetry.count("map_table", "update")
+        table = pipeline.update_map_table(cached[1], data, geojson, changed, key)
+    if cached is None or cached[0] < snapshot.version:
+        # a rerun still on an older snapshot does not replace a newer table
+        map_tables()[(path, level)] = (snapshot.version, table)
+    return table
+
+@st.cache_resource
+def rank_indexes():
+    # geometry level -> (data version, RankIndex), shared by all sessions
+    return {}
+
+def load_ranks(store, snapshot, table, level):
+    # Governorate ranking, redone once per data change and only for the
+    # changed metrics. Built on the map table, so regions carry the map's
+    # names with spelling variants merged, like the map colors them.
+    cached = rank_indexes().get(level)
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    changed = store.changed_since(cached[0], snapshot.version) if cached is not None else None
+    ranks = rank_index.RankIndex(pipeline.map_source(table), cached and cached[1], changed)
+    if cached is None or cached[0] < snapshot.version:
+        rank_indexes()[level] = (snapshot.version, ranks)
+    return ranks
+
+@telemetry.counted("history_table", st.cache_data)
+def load_history_table(period, version, level):
+    # One past period on the governorate map; `version` keys the partition file
+    geojson = load_geojson("governorates", level)
+    snapshot = ingest.rollup(history.read_period(period))
+    return pipeline.build_map_table(snapshot, geojson), snapshot
+
+@telemetry.counted("history_frames", st.cache_data)
+def load_history_frames(metric, versions, level):
+    # Reads a single metric column from the partitions of the range only
+    geojson = load_geojson("governorates", level)
+    periods = list(versions)
+    scores = history.read_range(periods[0], periods[-1], ["Location", metric])
+    frames = []
+    for period, snapshot in scores.groupby("period", sort=True):
+        # a reagent absent from a period stays missing (gray), not 0
+        snapshot = snapshot.drop(columns="period").groupby("Location").sum(min_count=1).reset_index()
+        table = pipeline.build_map_table(snapshot, geojson)
+        frames.append((period, table.ratios[metric].tolist(), table.values[metric].tolist()))
+    return frames
+
+@telemetry.counted("queries", st.cache_resource(max_entries=16))
+def load_queries(version, period, path, _df):
+    # Ranking queries for the data on screen. With GENESMART_ENGINE=duckdb they
+    # run as SQL over the compiled Parquet file when it is current, or over the
+    # history partitions for a past period (see queries.py).
+    live = not path and period is None
+    parquet = ingest.current_compiled(settings.DATA_PATH, (".parquet",)) if live else None
+    return queries.open_queries(_df, parquet=parquet, period=period)
+
+@telemetry.counted("composite", st.cache_resource(max_entries=32))
+def load_composite(weights, version, period, path, level, _table):
+    # One matrix-vector product per weight vector and data version; the
+    # composite map then costs what a single-metric map does (see composite.py)
+    return composite.composite(_table, dict(weights))
+
+@telemetry.counted("similarity", st.cache_resource(max_entries=8))
+def load_similarity(version, period, path, distance, _table):
+    # Nearest regions by reagent profile for the data on screen: a pairwise
+    # matrix for small views, a neighbour index for large ones (see similarity.py).
+    # Regions of the map table carry the map's names, spelling variants merged.
+    return similarity.SimilarityIndex(pipeline.map_source(_table), distance)
+
+@st.cache_resource
+def shared_figure_cache():
+    # One LRU per server process, shared by every session, backed by the
+    # cross-process cache when one is configured
+    return figure_cache.FigureCache(settings.FIGURE_CACHE_BYTES, figure_cache.default_backend())
+
+@st.cache_resource
+def warm_up():
+    # Once per server process, in the background: every metric's figure is
+    # built ahead of the clicks (see warmup.py; `python warmup.py` at deploy
+    # time also fills the caches shared with other processes)
+    thread = threading.Thread(
+        target=warmup.warm, args=(shared_score_store(), shared_figure_cache(), load_map_table),
+        name="genesmart-warmup", daemon=True,
+    )
+    thread.start()
+    return thread
+
+@st.cache_resource
+def metrics_endpoint():
+    # Prometheus scrape endpoint (GENESMART_METRICS_PORT), one per process
+    return telemetry.serve(settings.METRICS_PORT) if settings.METRICS_PORT else None
+
+# Drill-down: names of the regions clicked from the governorate map
+if 'geo_path' not in st.session_state:
+    st.session_state['geo_path'] = []
+    st.session_state['geo_nav'] = 0
+geo_path = tuple(st.session_state['geo_path'])
+depth = len(geo_path)
+geo_name = geography.LEVELS[depth].name
+# A drilled view only shows the regions of one parent: keep its detail
+geo_level = "high" if depth else geo_simplify.pick_level(geo_name, settings.MAP_HEIGHT)
+
+metrics_endpoint()
+with telemetry.timer("load_data"):
+    store = load_data()
+with telemetry.timer("geometry"):
+    geojson = load_geojson(geo_name, geo_level, geo_path)
+
+# Score history, on the governorate map only
+history_periods = history.periods() if not depth else []
+
+if store is not None and geojson is not None:
+    # Taken once: every table, version and figure key of this rerun comes
+    # from the same data, even if another session refreshes the store
+    snapshot = store.snapshot
+    if settings.WARMUP:
+        warm_up()
+    with telemetry.timer("map_table"):
+        map_table = load_map_table(store, snapshot, geojson, geo_level, geo_path)
+    df = pipeline.map_source(map_table) if depth else snapshot.grouped
+    if depth and df.empty:
+        # No region with scores below this one (score file or geometry
+        # changed since the click): back up instead of an empty view
+        st.session_state['geo_notice'] = f"Aucune région avec des scores sous {geo_path[-1]}."
+        st.session_state['geo_path'] = list(geo_path[:-1])
+        st.session_state['geo_nav'] += 1
+        st.rerun()
 
-if df is not None and geojson is not None:
     # Sidebar Metric Selection
     with st.sidebar:
         st.markdown("<div style='text-align: center; padding: 20px;'><img src='https://img.icons8.com/isometric/100/008080/microscope.png' width='80'></div>", unsafe_allow_html=True)
@@ -134,16 +290,24 @@ if df is not None and geojson is not None:
         st.markdown("<p style='color: #718096; font-size: 0.9em;'>Plateforme de Visualisation Biotech</p>", unsafe_allow_html=True)
         st.divider()
         
-        categories = {
-            "🧬 Pré-analytique": ["extraction adn", "cfdna", "zymo"],
-            "🧪 Réactifs de base": ["amorces pcr", "réactifs pcr", "taq polymerase"],
-            "🔬 PCR routinière": ["kit pcr", "qpcr", "rt-pcr"],
-            "🛰️ PCR avancée": ["pcr digital"],
-            "🩺 Applications cliniques": ["hla b51", "pylori"]
-        }
+        categories = settings.CATEGORIES
         
         if 'selected_metric' not in st.session_state:
-            st.session_state['selected_metric'] = "extraction adn"
+            st.session_state['selected_metric'] = settings.DEFAULT_METRIC
+
+        # Instant mode: the map carries every metric and switches in the browser
+        client_switching = st.toggle(
+            "Changement instantané",
+            key="client_switching",
+            help="Change de métrique directement sur la carte, sans recharger la page. "
+                 "Le classement et les insights suivent la sélection de la barre latérale."
+        )
+        # Small multiples: every metric at once, in a single figure
+        small_multiples = st.toggle(
+            "Vue d'ensemble",
+            key="small_multiples",
+            help="Affiche toutes les métriques côte à côte, sur la même échelle de couleurs."
+        )
 
         for cat, metrics in categories.items():
             with st.expander(cat, expanded=True):
@@ -151,121 +315,283 @@ if df is not None and geojson is not None:
                     is_selected = st.session_state['selected_metric'] == m
                     if st.button(m.capitalize(), key=f"btn_{m}"):
                         st.session_state['selected_metric'] = m
+                        st.session_state['ranking_rows'] = settings.RANKING_PAGE
                         st.rerun()
 
+        # Composite score: weighted sum of a category or of chosen metrics
+        st.divider()
+        st.markdown("**⚖️ Score composite**")
+        weights = {}
+        if st.toggle("Pondérer plusieurs métriques", key="composite"):
+            preset = st.selectbox("Métriques", ["Sélection libre", *categories], key="composite_category")
+            if preset in categories:
+                chosen = categories[preset]
+            else:
+                chosen = st.multiselect(
+                    "Sélection", settings.all_metrics(),
+                    default=[st.session_state['selected_metric']], key="composite_metrics"
+                )
+            for m in chosen:
+                weights[m] = st.slider(m.capitalize(), 0.0, 1.0, 1.0, 0.05, key=f"weight_{m}")
+
+        # Similar regions: a click on the map picks the reference region
+        st.divider()
+        st.markdown("**🧭 Régions similaires**")
+        similar = st.toggle(
+            "Profils similaires",
+            key="similar",
+            help="Cliquez une région de la carte pour mettre en évidence les régions "
+                 "dont le profil de réactifs est le plus proche."
+        )
+        if similar:
+            distance = st.radio(
+                "Distance", similarity.DISTANCES, horizontal=True, key="similar_distance",
+                format_func={"cosine": "Cosinus", "euclidean": "Euclidienne"}.get
+            )
+            similar_k = st.slider("Régions proches", 1, 10, 5, key="similar_k")
+
+        # Time slider over the monthly snapshots (history/period=YYYY-MM)
+        period = None
+        animate = False
+        if history_periods:
+            st.divider()
+            st.markdown("**🕒 Historique**")
+            period = st.select_slider("Période", options=[*history_periods, "Actuel"], value="Actuel", key="period")
+            animate = st.toggle("Animer l'évolution", key="animate")
+            if period == "Actuel":
+                period = None
+
+    if period is not None:
+        with telemetry.timer("history_table"):
+            history_table, history_df = load_history_table(period, history.partition_version(period), geo_level)
+        if st.session_state['selected_metric'] in history_table.values:
+            map_table, df = history_table, history_df
+        else:
+            # A reagent added after this period: show the current scores
+            st.info(
+                f"{st.session_state['selected_metric'].capitalize()} n'a pas de scores en {period} : "
+                "affichage des scores actuels."
+            )
+            period = None
+
     current_metric = st.session_state['selected_metric']
+    data_version = history.partition_version(period) if period is not None else snapshot.version
+
+    # Every metric of the view, before the composite replaces the table
+    metric_table = map_table
+    metrics = [m for m in settings.all_metrics() if m in map_table.values]
+
+    # Metrics weighted 0 or without data in this view do not count
+    weights = {m: w for m, w in weights.items() if w > 0 and m in map_table.values}
+    composite_ranks = None
+    if weights:
+        with telemetry.timer("composite"):
+            map_table, composite_ranks = load_composite(
+                tuple(sorted(weights.items())), data_version, period, geo_path, geo_level, map_table
+            )
+        current_metric = composite.NAME
+        # A single map: the switchable and animated figures are per metric
+        client_switching = animate = False
+    # The highlight outlines one map
+    small_multiples = small_multiples and not similar
+    if small_multiples:
+        client_switching = animate = False
 
     # Header section
     st.markdown(f"### {current_metric.capitalize()}")
+    if weights:
+        st.caption(composite.describe(weights))
     
     # Calculate Average for Threshold logic
-    avg_val = df[current_metric].mean()
+    avg_val = map_table.means[current_metric]
     
     col1, col2, col3 = st.columns([2,1,1])
     with col1:
         st.subheader("Distribution Géographique")
+        notice = st.session_state.pop('geo_notice', None)
+        if notice:
+            st.info(notice)
+        if depth:
+            st.caption(" › ".join(["Tunisie", *geo_path]) + f" · {geography.LEVELS[depth].label}")
+            if st.button("⬅ Niveau supérieur", key="geo_up"):
+                st.session_state['geo_path'] = list(geo_path[:-1])
+                st.session_state['geo_nav'] += 1
+                st.rerun()
     with col2:
         st.metric("Moyenne", f"{avg_val:.3f}")
     with col3:
-        # National Total
-        total_val = df[current_metric].sum()
-        st.metric("Total National", f"{total_val:.2f}")
+        # National Total (or total of the region drilled into)
+        total_val = map_table.totals[current_metric]
+        st.metric(f"Total {geo_path[-1]}" if depth else "Total National", f"{total_val:.2f}")
 
     # --- Map Preparation & Color Logic ---
-    # 1. Normalize values relative to the average (1.0 = Average)
-    # This allows a continuous scale where Yellow is always the Average
-    df['ratio_to_avg'] = df[current_metric] / avg_val
-    
-    # 2. Get all governorate names from GeoJSON to show the full country
-    all_govs = [f['properties']['gov_name_f'] for f in geojson['features']]
-    base_df = pd.DataFrame({'Location': all_govs})
-    
-    # 3. Merge with our data
-    map_df = pd.merge(base_df, df, on='Location', how='left')
-    
-    # 4. Handle missing data
-    map_df[current_metric] = map_df[current_metric].fillna(0)
-    # For regions without data, we'll use a special value or just handle them in the scale
-    # But usually, it's better to show them in a neutral gray if they are truly missing
-    map_df['ratio_to_avg'] = map_df['ratio_to_avg'].fillna(-1) # Special marker for gray
+    # Values are normalized relative to the average (1.0 = Average) so Yellow is
+    # always the Average; regions without data carry -1 and show in gray.
+    # Everything is precomputed in load_map_table, this is a column lookup.
+    map_df = pipeline.map_frame(map_table, current_metric)
 
     # Map Visualization
-    fig = px.choropleth(
-        map_df,
-        geojson=geojson,
-        locations="Location",
-        featureidkey="properties.gov_name_f",
-        color="ratio_to_avg",
-        # Customizing the color scale: Red -> Yellow -> Green
-        color_continuous_scale=[
-            [0.0, "#E2E8F0"],    # Missing data (Gray)
-            [0.0001, "#E74C3C"], # Low (Red)
-            [0.5, "#F1C40F"],    # Average (Yellow)
-            [1.0, "#2ECC71"]     # High (Green)
-        ],
-        # We'll calculate the bounds dynamically to keep the midpoint at 1.0
-        # If we use ratio_to_avg, we want 1.0 to be in the middle of the non-gray scale
-        range_color=[0, 2], # 0 to 2, where 1 is the middle
-        hover_data={"Location": True, current_metric: ":.3f", "ratio_to_avg": False},
-        labels={current_metric: "Valeur", "ratio_to_avg": "Ratio / Moyenne"}
-    )
-    
-    # Sharp traits (borders) and high visibility
-    fig.update_traces(
-        marker_line_width=1.5, 
-        marker_line_color="#2D3748", 
-        marker_opacity=1.0 
+    # The serialized figure only depends on the metric, its data, the
+    # geometry and the layout, so it is built once and shared by all sessions.
+    # Keys use per-metric data versions: an edit of the score file only
+    # invalidates the figures of the metrics it touched.
+    # WebGL (MapLibre) once the view has too many polygons for SVG
+    map_backend = figures.pick_backend(geojson)
+    history_versions = (
+        {p: history.partition_version(p) for p in history_periods} if animate else None
     )
-    
-    fig.update_geos(
-        fitbounds="geojson", 
-        visible=False,
-        projection_type="mercator"
+    figure_key = figures.figure_key(
+        "grid" if small_multiples else "composite" if weights else "animate" if animate
+        else "switch" if client_switching else "single",
+        metrics if small_multiples else sorted(weights.items()) if weights else current_metric,
+        [snapshot.metric_versions.get(m) for m in metrics] if small_multiples or client_switching
+        else [snapshot.metric_versions.get(m) for m in weights] if weights
+        else snapshot.metric_versions.get(current_metric),
+        geo_store.digest(f"{geo_name}@{geo_level}"),
+        geo_path,
+        settings.GEOMETRY_BY_URL,
+        settings.GRID_ROW_HEIGHT if small_multiples else settings.MAP_HEIGHT,
+        map_backend,
+        period=period,
+        period_version=period and history.partition_version(period),
+        history_versions=history_versions,
     )
 
-    fig.update_layout(
-        height=650, 
-        margin={"r":0,"t":30,"l":0,"b":0},
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        coloraxis_colorbar=dict(
-            title="Performance",
-            tickvals=[0.2, 1.0, 1.8],
-            ticktext=["Basse", "Moyenne", "Haute"],
-            lenmode="fraction", len=0.6,
-            thickness=15,
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="#eef2f6",
-            borderwidth=1,
-            yanchor="middle", y=0.5,
-            xanchor="left", x=0.02
-        ),
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=16,
-            font_family="Outfit"
-        )
-    )
+    geo_key = geography.key(geography.LEVELS[depth])
+    # The browser downloads the polygons once (content-addressed static file);
+    # every later figure only carries the color and hover arrays
+    geo_source = geo_url(geo_name, geo_level, geo_path) if settings.GEOMETRY_BY_URL else None
 
-    st.plotly_chart(fig, use_container_width=True)
+    def build_figure():
+        with telemetry.timer("figure_build"):
+            if small_multiples:
+                # One subplot per metric, all inheriting the geometry from the template
+                fig = figures.build_small_multiples(
+                    metric_table, geojson, metrics, settings.GRID_ROW_HEIGHT, geo_key, map_backend,
+                    geo_source
+                )
+            elif animate:
+                # One frame per period; frames only carry the color and hover arrays
+                frames = load_history_frames(current_metric, history_versions, geo_level)
+                if period is None:
+                    # The live scores described by the page close the animation
+                    frames = [*frames, ("Actuel", map_table.ratios[current_metric].tolist(),
+                                        map_table.values[current_metric].tolist())]
+                fig = figures.build_animated_choropleth(
+                    frames, map_table.values.index.tolist(), current_metric, geojson,
+                    settings.MAP_HEIGHT, geo_key, map_backend, geo_source, start=period or "Actuel"
+                )
+            elif client_switching:
+                # Every metric travels with the figure, the dropdown switches in the browser
+                fig = figures.build_switchable_choropleth(
+                    map_table, geojson, metrics, current_metric, settings.MAP_HEIGHT, geo_key, map_backend,
+                    geo_source
+                )
+            else:
+                fig = figures.build_choropleth(
+                    map_df, current_metric, geojson, settings.MAP_HEIGHT, geo_key, map_backend, geo_source
+                )
+        with telemetry.timer("figure_serialize"):
+            return fig.to_json()
+
+    with telemetry.timer("figure"):
+        fig_json = shared_figure_cache().get_or_build(figure_key, build_figure)
+    with telemetry.timer("figure_decode"):
+        figure = json.loads(fig_json)
+    nearest = None
+    if similar:
+        reference = st.session_state.get('similar_to')
+        with telemetry.timer("similarity"):
+            similar_index = load_similarity(data_version, period, geo_path, distance, metric_table)
+            nearest = similar_index.neighbors(reference, similar_k) if reference else None
+        if nearest is not None:
+            # Outlines drawn over the cached figure, no rebuild
+            figures.highlight(figure, reference, nearest['Location'].tolist())
+    if similar or geography.can_drill(depth, snapshot.finest.columns):
+        # Click a region to drill down into its delegations / sectors, or to
+        # pick the reference of the similar regions
+        with telemetry.timer("plotly_chart"):
+            event = st.plotly_chart(
+                figure, use_container_width=True,
+                on_select="rerun", selection_mode="points",
+                key=f"map_{st.session_state['geo_nav']}"
+            )
+        points = event.selection.points if event else []
+        if points:
+            clicked = points[0].get("location") or map_df['Location'].iloc[points[0]["point_index"]]
+            if similar:
+                st.session_state['similar_to'] = clicked
+            elif geography.has_children(snapshot.finest, (*geo_path, clicked)):
+                st.session_state['geo_path'] = [*geo_path, clicked]
+            else:
+                st.session_state['geo_notice'] = (
+                    f"Pas de {geography.LEVELS[depth + 1].label.lower()} pour {clicked} "
+                    "dans le fichier de scores."
+                )
+            st.session_state['geo_nav'] += 1
+            st.rerun()
+    else:
+        with telemetry.timer("plotly_chart"):
+            st.plotly_chart(figure, use_container_width=True)
+    if map_table.unmatched:
+        st.caption(f"⚠️ Régions sans correspondance sur la carte : {', '.join(map_table.unmatched)}")
 
     # Insights Panel
     st.markdown("---")
     c1, c2 = st.columns(2)
     with c1:
         st.markdown("#### Classement des Régions")
-        sorted_df = df.sort_values(by=current_metric, ascending=False)
-        st.dataframe(
-            sorted_df[['Location', current_metric]],
-            use_container_width=True,
-            hide_index=True
-        )
+        if composite_ranks is not None:
+            region_queries = composite_ranks
+        elif not depth and period is None and settings.QUERY_ENGINE != "duckdb":
+            # Ranked once per data change (see load_ranks);
+            # with GENESMART_ENGINE=duckdb, SQL over the compiled Parquet file
+            region_queries = load_ranks(store, snapshot, map_table, geo_level)
+        else:
+            region_queries = load_queries(data_version, period, geo_path, df)
+        # Only the rows asked for are selected and sent; the table scrolls
+        # in the browser and "Afficher plus" fetches the next page
+        region_count = region_queries.count()
+        shown = min(st.session_state.get('ranking_rows', settings.RANKING_PAGE), region_count)
+        with telemetry.timer("ranking"):
+            top_df = region_queries.top(current_metric, shown)
+            st.dataframe(
+                top_df[['Location', current_metric]],
+                use_container_width=True,
+                hide_index=True
+            )
+        if shown < region_count:
+            st.caption(f"{shown} régions sur {region_count}")
+            if st.button("Afficher plus", key="ranking_more"):
+                st.session_state['ranking_rows'] = shown + settings.RANKING_PAGE
+                st.rerun()
     with c2:
         st.markdown("#### 💡 Insights")
-        top_reg = sorted_df.iloc[0]['Location']
-        low_reg = sorted_df.iloc[-1]['Location']
-        st.info(f"📍 **Région Leader :** {top_reg} avec {sorted_df.iloc[0][current_metric]:.3f}")
-        st.warning(f"⚠️ **Région en Retrait :** {low_reg} avec {sorted_df.iloc[-1][current_metric]:.3f}")
+        if top_df.empty:
+            st.caption("Aucune région avec des scores.")
+        else:
+            leader = top_df.iloc[0]
+            laggard = region_queries.bottom(current_metric, 1).iloc[0]
+            st.info(f"📍 **Région Leader :** {leader['Location']} avec {leader[current_metric]:.3f}")
+            st.warning(f"⚠️ **Région en Retrait :** {laggard['Location']} avec {laggard[current_metric]:.3f}")
+        if nearest is not None:
+            st.markdown(f"**🧭 Profils proches de {reference}**")
+            st.dataframe(nearest, use_container_width=True, hide_index=True)
+        elif similar:
+            st.caption("🧭 Cliquez une région de la carte pour afficher les régions au profil similaire.")
+        if depth and not weights:
+            # National standing of the governorate drilled into
+            national_level = geo_simplify.pick_level("governorates", settings.MAP_HEIGHT)
+            national = load_map_table(
+                store, snapshot, load_geojson("governorates", national_level), national_level
+            )
+            ranks = load_ranks(store, snapshot, national, national_level)
+            position = ranks.position(current_metric, geo_path[0])
+            if position is not None:
+                st.caption(
+                    f"{geo_path[0]} : {position}ᵉ gouvernorat sur {ranks.count()} "
+                    f"(percentile {ranks.percentile(current_metric, geo_path[0]):.0f})"
+                )
         
         # Legend explanation
         st.markdown(f"""
@@ -278,3 +604,22 @@ if df is not None and geojson is not None:
 
 else:
     st.error("Impossible d'initialiser l'application. Vérifiez la connexion internet et les fichiers de données.")
+
+# Hidden diagnostics panel: GENESMART_DIAGNOSTICS=1 or ?diagnostics=1
+if settings.DIAGNOSTICS or st.query_params.get("diagnostics") == "1":
+    with st.sidebar.expander("⏱️ Diagnostics", expanded=True):
+        st.caption(f"Cette exécution : {telemetry.elapsed() * 1000:.0f} ms")
+        st.dataframe(
+            [{"Étape": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in telemetry.run_timings()],
+            use_container_width=True, hide_index=True
+        )
+        st.caption("Caches depuis le démarrage du serveur")
+        st.dataframe(
+            [
+                {"Cache": cache, "hit": 0, "miss": 0, **counts, "Taux": f"{counts.get('hit', 0) / sum(counts.values()):.0%}"}
+                for cache, counts in sorted(telemetry.cache_counts().items())
+            ],
+            use_container_width=True, hide_index=True
+        )
+
+telemetry.end_run(metric=st.session_state.get('selected_metric'), level=geo_level, depth=depth)
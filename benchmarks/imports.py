@@ -0,0 +1,119 @@
+"""Import time of the modules app.py loads, measured in fresh interpreters.
+
+    python -m benchmarks.imports            # report
+    python -m benchmarks.imports --save     # record this machine's baseline
+    python -m benchmarks.imports --check    # exit 1 on a regression
+
+Streamlit is imported before the clock starts: the server has loaded it long
+before the first script run, which is what pays for the app's own imports.
+The check also fails when a dependency that is only needed on demand (LAZY)
+gets imported at startup again.
+"""
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+BASELINE = os.path.join(ROOT, ".cache", "bench", "imports.json")
+
+# Loaded by the code paths that need them, never by a plain page view
+LAZY = ["plotly.express", "requests", "duckdb", "pyarrow.dataset"]
+
+# Allowed slowdown over the baseline before --check fails
+TOLERANCE = 1.25
+
+PROBE = """
+import json, sys, time
+import streamlit
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "lazy": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def startup_modules(path=APP):
+    """Top-level imports of app.py, besides streamlit."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [m for m in modules if m.split(".")[0] != "streamlit"]
+
+
+def _probe(modules):
+    code = PROBE.format(modules=modules, lazy=LAZY)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def heaviest(modules, count=10):
+    """Direct imports of the app modules with the largest cumulative time (µs)."""
+    code = "import streamlit\n" + "".join(f"import {m}\n" for m in modules)
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                         check=True, capture_output=True, text=True).stderr
+    seen = set(sys.stdlib_module_names) | {"streamlit"}
+    rows = []
+    for line in err.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        # -X importtime indents nested imports by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth <= 1 and name.split(".")[0] not in seen:
+            rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def measure(runs=7):
+    modules = startup_modules()
+    results = [_probe(modules) for _ in range(runs)]
+    seconds = [r["seconds"] for r in results]
+    return {
+        "modules": modules,
+        "runs": runs,
+        "median_s": statistics.median(seconds),
+        "min_s": min(seconds),
+        "lazy_imported": sorted(set().union(*(r["lazy"] for r in results))),
+        "python": sys.version.split()[0],
+    }
+
+
+def main(argv):
+    result = measure()
+    print(f"import des modules de l'app : médiane {result['median_s'] * 1000:.0f} ms, "
+          f"min {result['min_s'] * 1000:.0f} ms ({result['runs']} essais)")
+    for micros, name in heaviest(result["modules"]):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    if "--save" in argv:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"référence enregistrée : {BASELINE}")
+
+    failures = []
+    if result["lazy_imported"]:
+        failures.append(f"importés au démarrage : {', '.join(result['lazy_imported'])}")
+    if "--check" in argv and os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if result["median_s"] > baseline["median_s"] * TOLERANCE:
+            failures.append(f"médiane {result['median_s'] * 1000:.0f} ms "
+                            f"> référence {baseline['median_s'] * 1000:.0f} ms x{TOLERANCE}")
+    for failure in failures:
+        print(f"RÉGRESSION : {failure}")
+    return 1 if failures and "--check" in argv else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,279 @@
+"""Concurrent analysts clicking through metrics, against a running server.
+
+    python -m benchmarks.load --users 20 --clicks 30
+    python -m benchmarks.load --configs nocache,lru,warmup,shared-disk --regions 2000
+    python -m benchmarks.load --url http://localhost:8501 --users 10
+
+Each simulated user opens a session over Streamlit's websocket protocol (as
+the browser does), waits for the first run, then clicks metric buttons of the
+sidebar at random. A rerun is timed from the click to the end of the script
+run it triggers (button handlers call st.rerun(), so that is the second run).
+
+Without --url, one server is started per caching configuration (CONFIGS) on
+a synthetic dataset (synthetic.py), and its memory per session (RSS growth
+over the sessions, after a priming session) and CPU use are read from /proc.
+Reports p50/p95/p99 rerun latencies and throughput; results are written as
+JSON under .cache/bench/. Needs the `websockets` package (installed with
+Streamlit's server).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import settings
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+RESULTS_DIR = os.path.join(ROOT, ".cache", "bench")
+
+# Caching configurations compared; "{tmp}" is the run's scratch directory
+CONFIGS = {
+    "nocache": {"GENESMART_FIGURE_CACHE_BYTES": "0", "GENESMART_WARMUP": "0"},
+    "lru": {"GENESMART_WARMUP": "0"},
+    "warmup": {},
+    "shared-disk": {"GENESMART_CACHE_URL": "disk://{tmp}/shared"},
+}
+
+# ScriptFinishedStatus of a run interrupted by st.rerun()
+FINISHED_EARLY_FOR_RERUN = 2
+
+
+class Session:
+    """One browser tab: a websocket session driving script runs."""
+
+    def __init__(self, url, timeout=120):
+        from websockets.sync.client import connect
+
+        ws_url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self._ws = connect(ws_url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout)
+        self.timeout = timeout
+        self.buttons = set()
+
+    def __enter__(self):
+        self._ws.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._ws.__exit__(*exc)
+
+    def button(self, key):
+        """Widget id of the button with `key`, or None if it was not rendered."""
+        # widget ids end with the key, which may contain "-": "$$ID-<hash>-btn_rt-pcr"
+        return next((i for i in self.buttons if i.endswith(f"-{key}")), None)
+
+    def run(self, trigger=None):
+        """Request a script run (clicking `trigger`); return its duration."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        if trigger is not None:
+            widget = msg.rerun_script.widget_states.widgets.add()
+            widget.id = trigger
+            widget.trigger_value = True
+        started = time.perf_counter()
+        self._ws.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self._ws.recv(timeout=self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "delta":
+                element = forward.delta.new_element
+                if element.WhichOneof("type") == "button":
+                    self.buttons.add(element.button.id)
+            elif kind == "script_finished" and forward.script_finished != FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - started
+
+
+def _user(url, clicks, think, seed, results, errors, start):
+    rng = random.Random(seed)
+    try:
+        with Session(url) as session:
+            start.wait()
+            results["first"].append(session.run())
+            buttons = [session.button(f"btn_{m}") for m in settings.all_metrics()]
+            buttons = [b for b in buttons if b is not None]
+            for _ in range(clicks):
+                results["click"].append(session.run(rng.choice(buttons)))
+                if think:
+                    time.sleep(rng.uniform(0, 2 * think))
+    except Exception as e:
+        errors.append(repr(e))
+        start.abort()
+
+
+def _percentiles(values):
+    if len(values) < 2:
+        return {"p50": values[0] if values else None, "p95": None, "p99": None}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def _proc_stats(pid):
+    """(RSS bytes, CPU seconds) of a process, or (None, None) without /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        return rss, cpu
+    except (OSError, StopIteration):
+        return None, None
+
+
+def load_test(url, users, clicks, think=0.0, pid=None):
+    """Run `users` concurrent sessions of `clicks` metric clicks each."""
+    if pid is not None:
+        # priming session: the first one pays for imports and data loading
+        with Session(url) as primer:
+            primer.run()
+    rss_before, cpu_before = _proc_stats(pid) if pid else (None, None)
+
+    results = {"first": [], "click": []}
+    errors = []
+    start = threading.Barrier(users)
+    threads = [
+        threading.Thread(target=_user, args=(url, clicks, think, n, results, errors, start))
+        for n in range(users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    rss_after, cpu_after = _proc_stats(pid) if pid else (None, None)
+
+    report = {
+        "users": users,
+        "clicks": len(results["click"]),
+        "errors": errors,
+        "wall_s": wall,
+        "reruns_per_s": len(results["click"]) / wall if wall else None,
+        "first_run": _percentiles(results["first"]),
+        "rerun": _percentiles(results["click"]),
+    }
+    if rss_before is not None and rss_after is not None:
+        report["rss_mb"] = rss_after / 2**20
+        report["mb_per_session"] = (rss_after - rss_before) / 2**20 / users
+        report["cpu_percent"] = 100 * (cpu_after - cpu_before) / wall
+    return report
+
+
+def _wait_healthy(url, server, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"le serveur s'est arrêté (code {server.returncode})")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.3)
+    raise TimeoutError("le serveur ne répond pas")
+
+
+def run_config(name, directory, port, users, clicks, think):
+    """Start a server with the caching configuration `name` and load it."""
+    env = dict(os.environ)
+    for variable in ("GENESMART_CACHE_URL", "GENESMART_FIGURE_CACHE_DIR"):
+        env.pop(variable, None)
+    env.update({
+        "GENESMART_DATA_PATH": os.path.join(directory, "dataheatmap.csv"),
+        "GENESMART_GEO_DIR": os.path.join(directory, "geo"),
+        "GENESMART_HISTORY_DIR": os.path.join(directory, "history"),
+        "GENESMART_STATIC_DIR": os.path.join(directory, "static"),
+        "GENESMART_OFFLINE": "1",
+    })
+    scratch = os.path.join(directory, name)
+    env.update({k: v.format(tmp=scratch) for k, v in CONFIGS[name].items()})
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_healthy(url, server)
+        return load_test(url, users, clicks, think, pid=server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _ms(value):
+    return f"{value * 1000:7.0f}" if value is not None else "      -"
+
+
+def print_report(name, report):
+    rerun = report["rerun"]
+    line = (f"{name:12} {report['users']:3} users  {report['clicks']:5} clics  "
+            f"{report['reruns_per_s']:6.1f}/s  p50 {_ms(rerun['p50'])} ms  "
+            f"p95 {_ms(rerun['p95'])} ms  p99 {_ms(rerun['p99'])} ms  "
+            f"1re exécution p50 {_ms(report['first_run']['p50'])} ms")
+    if "mb_per_session" in report:
+        line += (f"  {report['mb_per_session']:.1f} Mo/session  RSS {report['rss_mb']:.0f} Mo"
+                 f"  CPU {report['cpu_percent']:.0f} %")
+    print(line, flush=True)
+    for error in report["errors"][:3]:
+        print(f"  erreur : {error}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--url", help="load an already running server instead")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--clicks", type=int, default=20, help="metric clicks per user")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between clicks (s)")
+    parser.add_argument("--configs", default=",".join(CONFIGS))
+    parser.add_argument("--regions", type=int, default=264)
+    parser.add_argument("--metrics", type=int, default=len(settings.all_metrics()))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="JSON result file")
+    args = parser.parse_args(argv)
+
+    reports = {}
+    if args.url:
+        reports["url"] = load_test(args.url, args.users, args.clicks, args.think)
+        print_report(args.url, reports["url"])
+    else:
+        with tempfile.TemporaryDirectory(prefix="genesmart-load-") as directory:
+            paths = synthetic.generate(directory, args.regions, args.metrics)
+            subprocess.run(
+                [sys.executable, "geo_store.py", "import", paths["geojson"], "governorates"],
+                cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+                env={**os.environ, "GENESMART_GEO_DIR": os.path.join(directory, "geo")},
+            )
+            for name in args.configs.split(","):
+                reports[name] = run_config(name, directory, args.port, args.users, args.clicks,
+                                           args.think)
+                print_report(name, reports[name])
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "regions": None if args.url else args.regions,
+            "metrics": None if args.url else args.metrics,
+            "think_s": args.think,
+            "configs": reports,
+        }, f, indent=2)
+    print(f"résultats : {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,203 @@
+"""Timings of the dashboard stages on synthetic datasets of growing size.
+
+    python -m benchmarks.pipeline                               # full grid
+    python -m benchmarks.pipeline --regions 24,1000 --metrics 10,100
+    python -m benchmarks.pipeline --no-app                      # pipeline only
+    python -m benchmarks.pipeline --compare old.json new.json
+
+Each dataset (regions x metrics) comes from synthetic.py: a score file in the
+export format (with split rows, missing regions and spelling variants) and a
+grid of polygons keyed like the governorates. The pipeline stages are timed
+by calling the modules directly: score file parse (what load_data does on a
+cold start), compiled file read, GeoJSON parse and simplification, map table
+and map frame, figure construction and serialization (with the geometry
+embedded and by URL). The app itself then runs headless in a fresh process
+with Streamlit's AppTest: first run, plain rerun and a metric button click.
+
+Results are written as JSON (under .cache/bench/ by default) so two runs can
+be compared with --compare.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import figures
+import geo_simplify
+import geography
+import ingest
+import pipeline
+import score_store
+import settings
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+RESULTS_DIR = os.path.join(ROOT, ".cache", "bench")
+
+REGIONS = [24, 1000, 10000]
+METRICS = [10, 100, 1000]
+REPEAT = 3
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def bench_pipeline(directory, regions, metrics, repeat=REPEAT):
+    paths = synthetic.generate(directory, regions, metrics)
+    csv_path, geo_path = paths["scores"], paths["geojson"]
+    columns = synthetic.metric_names(metrics)
+    metric = columns[0]
+    stages, sizes = {}, {}
+
+    def load_data():
+        store = score_store.ScoreStore(csv_path)
+        store.refresh()
+        return store
+
+    stages["load_data"], store = _time(load_data, repeat)
+    if ingest.pa is not None:
+        compiled = ingest.compiled_paths(csv_path)[0]
+        ingest.compile_scores(csv_path, compiled)
+        stages["load_compiled"], _ = _time(lambda: ingest.read_compiled(compiled).to_pandas(), repeat)
+
+    with open(geo_path, "rb") as f:
+        raw = f.read()
+    sizes["geojson_bytes"] = len(raw)
+    stages["geojson_parse"], geojson = _time(lambda: json.loads(raw), repeat)
+    tolerance, precision = geo_simplify.LEVELS["medium"]
+    stages["geojson_simplify"], simplified = _time(
+        lambda: geo_simplify.simplify(geojson, tolerance, precision), 1)
+    sizes["geojson_medium_bytes"] = len(json.dumps(simplified, separators=(",", ":")))
+
+    key = geography.key(geography.LEVELS[0])
+    stages["map_table"], table = _time(
+        lambda: pipeline.build_map_table(store.snapshot.grouped, simplified, key), repeat)
+    stages["map_frame"], map_df = _time(lambda: pipeline.map_frame(table, metric), repeat)
+
+    backend = figures.pick_backend(simplified)
+    for suffix, source in (("", None), ("_url", "app/static/geo/benchmark.geojson")):
+        stages[f"figure_build{suffix}"], fig = _time(
+            lambda: figures.build_choropleth(map_df, metric, simplified, settings.MAP_HEIGHT, key,
+                                             backend, source), repeat)
+        stages[f"figure_serialize{suffix}"], payload = _time(fig.to_json, repeat)
+        sizes[f"figure{suffix}_bytes"] = len(payload.encode("utf-8"))
+    return {"backend": backend, "stages": stages, "sizes": sizes}
+
+
+def bench_app(directory, metrics):
+    """First run, rerun and metric click of the real app, in a fresh process."""
+    env = dict(os.environ)
+    # measure the app's own work: no cache left over from another run
+    for name in ("GENESMART_CACHE_URL", "GENESMART_FIGURE_CACHE_DIR"):
+        env.pop(name, None)
+    env.update({
+        "GENESMART_DATA_PATH": os.path.join(directory, "dataheatmap.csv"),
+        "GENESMART_GEO_DIR": os.path.join(directory, "geo"),
+        "GENESMART_HISTORY_DIR": os.path.join(directory, "history"),
+        "GENESMART_STATIC_DIR": os.path.join(directory, "static"),
+        "GENESMART_OFFLINE": "1",
+    })
+    known = [m for m in synthetic.metric_names(metrics) if m in settings.all_metrics()]
+    clicked = [m for m in known if m != settings.DEFAULT_METRIC][-1]
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.pipeline", "--app-worker", directory, clicked],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _app_worker(directory, metric):
+    import geo_store
+    from streamlit.testing.v1 import AppTest
+
+    with open(os.path.join(directory, "governorates.geojson"), "rb") as f:
+        geo_store.put("governorates", f.read(), share=False)
+
+    def run(at):
+        started = time.perf_counter()
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return time.perf_counter() - started
+
+    at = AppTest.from_file(APP, default_timeout=600)
+    stages = {"app_first_run": run(at), "app_rerun": run(at)}
+    at.button(key=f"btn_{metric}").click()
+    stages["app_metric_click"] = run(at)
+    print(json.dumps(stages))
+    return 0
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["regions"], r["metrics"]): r for r in json.load(f)["runs"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["runs"]
+    for run in new:
+        before = old.get((run["regions"], run["metrics"]))
+        if before is None:
+            continue
+        print(f"{run['regions']} régions x {run['metrics']} métriques")
+        for stage, seconds in run["stages"].items():
+            if stage in before["stages"]:
+                ratio = seconds / max(before["stages"][stage], 1e-9)
+                print(f"  {stage:24} {before['stages'][stage] * 1000:10.1f} ms -> "
+                      f"{seconds * 1000:10.1f} ms  x{ratio:.2f}")
+    return 0
+
+
+def _sizes(text):
+    return [int(n) for n in text.split(",")]
+
+
+def main(argv):
+    if argv[:1] == ["--app-worker"]:
+        return _app_worker(argv[1], argv[2])
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.pipeline")
+    parser.add_argument("--regions", type=_sizes, default=REGIONS)
+    parser.add_argument("--metrics", type=_sizes, default=METRICS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--no-app", action="store_true", help="skip the AppTest runs")
+    parser.add_argument("--out", help="JSON result file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+    if args.compare:
+        return compare(*args.compare)
+
+    runs = []
+    for regions in args.regions:
+        for metrics in args.metrics:
+            with tempfile.TemporaryDirectory(prefix="genesmart-bench-") as directory:
+                result = bench_pipeline(directory, regions, metrics, args.repeat)
+                if not args.no_app:
+                    result["stages"].update(bench_app(directory, metrics))
+            runs.append({"regions": regions, "metrics": metrics, **result})
+            stages = "  ".join(f"{k}={v * 1000:.0f}ms" for k, v in result["stages"].items())
+            print(f"{regions} x {metrics} [{result['backend']}] {stages}", flush=True)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "engine": settings.QUERY_ENGINE,
+            "runs": runs,
+        }, f, indent=2)
+    print(f"résultats : {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
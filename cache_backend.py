@@ -0,0 +1,191 @@
+"""Byte caches shared between server processes.
+
+Streamlit's caches live in one process, so every replica would re-parse the
+scores, re-simplify the geometry and rebuild the figures. These backends hold
+the serialized results instead; all of them only need get / set / delete of
+bytes, so any Redis-compatible server (or a local stand-in) can be used.
+
+    GENESMART_CACHE_URL=disk:///var/cache/genesmart
+    GENESMART_CACHE_URL=redis://localhost:6379/0
+    GENESMART_CACHE_URL=memory://
+"""
+import hashlib
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import settings
+import telemetry
+
+
+class MemoryBackend:
+    """Process-local backend (tests, single-process runs)."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._items.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class DiskBackend:
+    """One file per key; shared by the processes of a host (or a shared volume)
+    and kept across restarts. Writes are atomic renames, so readers never see
+    a partial entry.
+
+    Entries older than `ttl` seconds are misses, like Redis expiry. Once the
+    directory grows past `max_bytes`, the oldest entries (by mtime) are
+    removed until it is back under 90% of the cap. Each process counts its
+    own writes from the last scan, so the cap is approximate when several
+    processes share the directory.
+    """
+
+    def __init__(self, directory, max_bytes=None, ttl=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def _expired(self, mtime, now):
+        return self.ttl is not None and now - mtime > self.ttl
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if self._expired(os.fstat(f.fileno()).st_mtime, time.time()):
+                    return None
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+        if self.max_bytes is not None:
+            with self._lock:
+                if self._size is None:
+                    self._size = self._scan()[1]
+                else:
+                    self._size += len(value)
+                if self._size > self.max_bytes:
+                    self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _scan(self):
+        # (mtime, size, path) of every entry, and their total size
+        entries, total = [], 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def _evict(self):
+        # caller holds the lock; rescans to see the other processes' writes
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= target and not self._expired(mtime, now):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            telemetry.count("disk_cache", "evict")
+        self._size = total
+
+
+class RedisBackend:
+    def __init__(self, url, ttl=None):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value):
+        self._client.set(key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+class Counted:
+    """Backend wrapper counting hits and misses per key prefix (see telemetry.py)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, key):
+        value = self.backend.get(key)
+        telemetry.count(f"shared:{key.partition(':')[0]}", "miss" if value is None else "hit")
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+
+def from_url(url):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme in ("disk", "file"):
+        return DiskBackend(parsed.path or os.path.join(".cache", "shared"),
+                           settings.CACHE_DISK_BYTES, settings.CACHE_TTL)
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisBackend(url, settings.CACHE_TTL)
+    raise ValueError(f"Backend de cache inconnu : {url!r}")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """The backend configured by GENESMART_CACHE_URL, or None."""
+    global _shared
+    if _shared is None and settings.CACHE_URL:
+        with _shared_lock:
+            if _shared is None:
+                _shared = Counted(from_url(settings.CACHE_URL))
+    return _shared
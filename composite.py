@@ -0,0 +1,51 @@
+"""Composite score: a weighted sum of several metrics.
+
+Weights (a whole category or any selection of metrics) are normalized to sum
+to 1 and applied to the region x metric matrix of the map table in a single
+matrix-vector product. The result is a one-metric map table, colored like any
+other metric (1.0 = average of the regions with data), and the rank index of
+its regions for the ranking panel and the insights.
+"""
+import numpy as np
+import pandas as pd
+
+import pipeline
+import rank_index
+
+NAME = "score composite"
+
+
+def weight_vector(weights, metrics):
+    """`weights` ({metric: weight}) aligned on `metrics` and summing to 1."""
+    w = np.array([weights.get(m, 0.0) for m in metrics], dtype=float)
+    total = w.sum()
+    if total <= 0:
+        raise ValueError("Score composite : au moins un poids doit être positif")
+    return w / total
+
+
+def describe(weights):
+    total = sum(weights.values())
+    return " + ".join(f"{w / total:.2f} × {m}" for m, w in weights.items())
+
+
+def composite(table, weights):
+    """Map table of the weighted score and the rank index of its regions."""
+    metrics = list(table.values.columns)
+    w = weight_vector(weights, metrics)
+    scores = table.values.to_numpy(dtype=float) @ w
+    # a region has data when one of the weighted metrics has
+    has_data = (table.ratios.to_numpy()[:, w > 0] >= 0).any(axis=1)
+    mean = scores[has_data].mean() if has_data.any() else np.nan
+    ratios = np.where(has_data, scores / mean, -1.0)
+
+    locations = table.values.index
+    combined = pipeline.MapTable(
+        pd.DataFrame({NAME: scores}, index=locations),
+        pd.DataFrame({NAME: ratios}, index=locations),
+        pd.Series({NAME: mean}),
+        pd.Series({NAME: scores[has_data].sum()}),
+        table.unmatched,
+    )
+    ranked = pd.DataFrame({"Location": locations[has_data], NAME: scores[has_data]})
+    return combined, rank_index.RankIndex(ranked)
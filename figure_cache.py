@@ -0,0 +1,113 @@
+"""Size-bounded LRU cache of serialized figures, shared by every session.
+
+Figures are deterministic for a given metric, dataset and layout, so the
+serialized JSON is built once and reused by concurrent users. A backend from
+cache_backend.py can sit behind the in-memory LRU so other server processes
+reuse the figures and a restarted server starts warm.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import cache_backend
+import settings
+import telemetry
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def default_backend():
+    """The cross-process cache if configured, else GENESMART_FIGURE_CACHE_DIR."""
+    backend = cache_backend.shared()
+    if backend is None and settings.FIGURE_CACHE_DIR:
+        backend = cache_backend.Counted(cache_backend.DiskBackend(
+            settings.FIGURE_CACHE_DIR, settings.CACHE_DISK_BYTES, settings.CACHE_TTL
+        ))
+    return backend
+
+
+class FigureCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, backend=None):
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _remember(self, key, payload):
+        # caller holds the lock
+        if key in self._items:
+            self._size -= len(self._items.pop(key))
+        if len(payload) > self.max_bytes:
+            return
+        self._items[key] = payload
+        self._size += len(payload)
+        while self._size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+                telemetry.count("figure", "hit")
+                return payload
+        if self.backend is not None:
+            raw = self.backend.get(f"figure:{key}")
+            if raw is not None:
+                payload = raw.decode("utf-8")
+                with self._lock:
+                    self._remember(key, payload)
+                telemetry.count("figure", "backend")
+                return payload
+        telemetry.count("figure", "miss")
+        return None
+
+    def put(self, key, payload):
+        with self._lock:
+            self._remember(key, payload)
+        if self.backend is not None:
+            self.backend.set(f"figure:{key}", payload.encode("utf-8"))
+
+    def get_or_build(self, key, build):
+        """Return the cached JSON for `key`, calling `build()` once on a miss.
+
+        Concurrent misses on the same key wait for the first builder instead
+        of building the same figure several times.
+        """
+        payload = self.get(key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            event = self._building.get(key)
+            owner = event is None
+            if owner:
+                event = self._building[key] = threading.Event()
+        if not owner:
+            event.wait()
+            payload = self.get(key)
+            if payload is not None:
+                return payload
+            return build()
+        try:
+            payload = build()
+            self.put(key, payload)
+            return payload
+        finally:
+            with self._lock:
+                del self._building[key]
+            event.set()
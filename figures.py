@@ -0,0 +1,324 @@
+"""Choropleth figures of the dashboard.
+
+Two backends draw the same map: "svg" (plotly geo, fine for the 24
+governorates) and "webgl" (MapLibre through go.Choroplethmap with a blank
+style, so no tile server is needed), which stays fluid with thousands of
+delegation or sector polygons.
+"""
+import math
+import os
+
+import plotly.graph_objects as go
+
+import figure_cache
+import geo_store
+
+# Customizing the color scale: Red -> Yellow -> Green
+COLOR_SCALE = [
+    [0.0, "#E2E8F0"],    # Missing data (Gray)
+    [0.0001, "#E74C3C"], # Low (Red)
+    [0.5, "#F1C40F"],    # Average (Yellow)
+    [1.0, "#2ECC71"]     # High (Green)
+]
+
+# ratio_to_avg spans 0 to 2, where 1 (the average) is the middle of the non-gray scale
+RANGE_COLOR = [0, 2]
+
+HOVER_TEMPLATE = "Location=%{location}<br>Valeur=%{customdata[0]:.3f}<extra></extra>"
+
+# Bump when the styling below changes so cached figures are rebuilt
+STYLE_VERSION = 3
+
+# Outlines of a region and of the regions similar to it (see highlight)
+HIGHLIGHT_COLORS = ("#0056b3", "#008080")
+
+# Small multiples: maps per row of the grid
+GRID_COLUMNS = 4
+
+# From this many regions on, SVG paths get slow to draw and pan
+WEBGL_MIN_FEATURES = 500
+
+
+def layout_settings(height, backend="svg"):
+    """Everything besides the data that determines a figure (figure cache key)."""
+    return [STYLE_VERSION, COLOR_SCALE, RANGE_COLOR, HOVER_TEMPLATE, height, backend]
+
+
+def figure_key(mode, metric, data_versions, geo_digest, geo_path, by_url, height, backend="svg",
+               period=None, period_version=None, history_versions=None):
+    """Figure cache key of a map: everything its serialized JSON depends on.
+
+    Used by the app and by warmup.py, so figures built ahead of time are hits.
+    """
+    return figure_cache.make_key(
+        mode, period, period_version, history_versions, metric, data_versions,
+        geo_digest, geo_path, by_url, layout_settings(height, backend),
+    )
+
+
+def pick_backend(geojson):
+    forced = os.environ.get("GENESMART_MAP_BACKEND")
+    if forced:
+        return forced
+    return "webgl" if len(geojson["features"]) >= WEBGL_MIN_FEATURES else "svg"
+
+
+def _map_view(geojson, height):
+    # fitbounds only exists for geo subplots: center and zoom from the bounds
+    west, south, east, north = geo_store.bounds(geojson)
+    # mercator stretches latitudes by about 1/cos(lat) around Tunisia
+    stretch = 1 / math.cos(math.radians((south + north) / 2))
+    extent = max(east - west, (north - south) * stretch, 1e-6)
+    return dict(
+        style="white-bg",
+        center=dict(lon=(west + east) / 2, lat=(south + north) / 2),
+        zoom=math.log2(height * 360 / (256 * extent)) - 0.3,
+    )
+
+
+def _trace(backend, geojson, locations, key, z, customdata):
+    # geojson is either the FeatureCollection or the URL it is published at
+    trace = go.Choroplethmap if backend == "webgl" else go.Choropleth
+    return trace(
+        geojson=geojson,
+        locations=locations,
+        featureidkey=f"properties.{key}",
+        z=z,
+        customdata=customdata,
+        coloraxis="coloraxis",
+        hovertemplate=HOVER_TEMPLATE,
+    )
+
+
+def _style(fig, height, backend="svg", geojson=None):
+    # Sharp traits (borders) and high visibility
+    fig.update_traces(
+        marker_line_width=1.5, 
+        marker_line_color="#2D3748", 
+        marker_opacity=1.0 
+    )
+    
+    if backend == "webgl":
+        fig.update_layout(map=_map_view(geojson, height))
+    else:
+        fig.update_geos(
+            fitbounds="geojson", 
+            visible=False,
+            projection_type="mercator"
+        )
+
+    fig.update_layout(
+        height=height, 
+        margin={"r":0,"t":30,"l":0,"b":0},
+        **_color_layout()
+    )
+    return fig
+
+
+def _color_layout():
+    # Shared color axis, legend and hover labels of every map
+    return dict(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        coloraxis=dict(colorscale=COLOR_SCALE, cmin=RANGE_COLOR[0], cmax=RANGE_COLOR[1]),
+        coloraxis_colorbar=dict(
+            title="Performance",
+            tickvals=[0.2, 1.0, 1.8],
+            ticktext=["Basse", "Moyenne", "Haute"],
+            lenmode="fraction", len=0.6,
+            thickness=15,
+            bgcolor="rgba(255,255,255,0.8)",
+            bordercolor="#eef2f6",
+            borderwidth=1,
+            yanchor="middle", y=0.5,
+            xanchor="left", x=0.02
+        ),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=16,
+            font_family="Outfit"
+        )
+    )
+
+
+def highlight(figure, reference, neighbors):
+    """Outline `reference` and its `neighbors` on a decoded figure.
+
+    Adds a transparent trace over the map's own geometry (the same object or
+    URL, so nothing is downloaded again): the cached figure is reused as is.
+    """
+    base = figure["data"][0]
+    locations = [reference, *neighbors]
+    reference_color, neighbor_color = HIGHLIGHT_COLORS
+    figure["data"].append({
+        "type": base["type"],
+        "geojson": base["geojson"],
+        "featureidkey": base["featureidkey"],
+        "locations": locations,
+        "z": [0] * len(locations),
+        "colorscale": [[0, "rgba(0,0,0,0)"], [1, "rgba(0,0,0,0)"]],
+        "showscale": False,
+        "marker": {"line": {
+            "width": [4] + [3] * len(neighbors),
+            "color": [reference_color] + [neighbor_color] * len(neighbors),
+        }},
+        "hoverinfo": "skip",
+    })
+    return figure
+
+
+def build_choropleth(map_df, metric, geojson, height, key="gov_name_f", backend="svg",
+                     geo_source=None):
+    """Map of one metric; `geo_source` (a URL) replaces the embedded geometry."""
+    fig = go.Figure(_trace(
+        backend, geo_source or geojson, map_df["Location"], key,
+        map_df["ratio_to_avg"], map_df[[metric]].to_numpy(),
+    ))
+    return _style(fig, height, backend, geojson)
+
+
+def _metric_title(table, metric):
+    return (f"{metric.capitalize()} · Moyenne {table.means[metric]:.3f}"
+            f" · Total National {table.totals[metric]:.2f}")
+
+
+def build_switchable_choropleth(table, geojson, metrics, initial, height, key="gov_name_f",
+                                backend="svg", geo_source=None):
+    """One figure carrying every metric, switched in the browser by a dropdown.
+
+    Only the color and hover arrays change between metrics, so a switch is a
+    client-side restyle with no server round trip.
+    """
+    locations = table.values.index.tolist()
+
+    def trace_args(metric):
+        return {
+            "z": [table.ratios[metric].tolist()],
+            "customdata": [table.values[[metric]].to_numpy().tolist()],
+        }
+
+    initial_args = trace_args(initial)
+    fig = go.Figure(_trace(
+        backend, geo_source or geojson, locations, key,
+        initial_args["z"][0], initial_args["customdata"][0],
+    ))
+    fig.update_layout(
+        title=dict(text=_metric_title(table, initial), x=0.5, font_size=14),
+        updatemenus=[dict(
+            type="dropdown",
+            active=metrics.index(initial),
+            x=0.99, xanchor="right", y=0.99, yanchor="top",
+            bgcolor="white",
+            buttons=[
+                dict(
+                    label=m.capitalize(),
+                    method="update",
+                    args=[trace_args(m), {"title.text": _metric_title(table, m)}],
+                )
+                for m in metrics
+            ],
+        )],
+    )
+    return _style(fig, height, backend, geojson)
+
+
+def build_animated_choropleth(frames, locations, metric, geojson, height, key="gov_name_f",
+                              backend="svg", geo_source=None, start=None):
+    """Map of one metric over time: one animation frame per period.
+
+    `frames` is a list of (period, ratios, values) aligned with `locations`;
+    frames only carry these arrays, the geometry stays in the base trace.
+    The map opens on the frame named `start` (the first one by default).
+    """
+    def hover(values):
+        return [[v] for v in values]
+
+    periods = [period for period, _, _ in frames]
+    active = periods.index(start) if start in periods else 0
+    _, ratios, values = frames[active]
+    fig_type = "choroplethmap" if backend == "webgl" else "choropleth"
+    fig = go.Figure(
+        _trace(backend, geo_source or geojson, locations, key, ratios, hover(values)),
+        frames=[
+            go.Frame(name=period, data=[dict(type=fig_type, z=ratios, customdata=hover(values))])
+            for period, ratios, values in frames
+        ],
+    )
+    step = {"frame": {"duration": 0, "redraw": True}, "mode": "immediate"}
+    fig.update_layout(
+        title=dict(text=metric.capitalize(), x=0.5, font_size=14),
+        updatemenus=[dict(
+            type="buttons", direction="left", showactive=False,
+            x=0.02, xanchor="left", y=0.02, yanchor="bottom",
+            buttons=[
+                dict(label="▶", method="animate",
+                     args=[None, {"frame": {"duration": 900, "redraw": True}, "fromcurrent": True}]),
+                dict(label="⏸", method="animate", args=[[None], step]),
+            ],
+        )],
+        sliders=[dict(
+            active=active, x=0.12, len=0.85, y=0.02, yanchor="bottom",
+            currentvalue=dict(prefix="Période : "),
+            steps=[dict(label=period, method="animate", args=[[period], step]) for period, _, _ in frames],
+        )],
+    )
+    return _style(fig, height, backend, geojson)
+
+
+def build_small_multiples(table, geojson, metrics, row_height, key="gov_name_f", backend="svg",
+                          geo_source=None, columns=GRID_COLUMNS):
+    """Every metric as a small map of one figure, on a shared color scale.
+
+    The geometry, locations and trace styling are set once, in the figure's
+    template, and inherited by the trace of every subplot: each subplot only
+    carries its color and hover arrays, so the payload is about that of a
+    single map plus one array pair per metric. By URL, the browser fetches
+    the geometry once for all subplots.
+    """
+    rows = math.ceil(len(metrics) / columns)
+    webgl = backend == "webgl"
+    trace_type, subplot = ("choroplethmap", "map") if webgl else ("choropleth", "geo")
+    gap = 0.01
+
+    fig = go.Figure()
+    shared = _trace(backend, geo_source or geojson, table.values.index.tolist(), key, None, None)
+    shared.update(marker_line_width=0.5, marker_line_color="#2D3748", marker_opacity=1.0)
+    setattr(fig.layout.template.data, trace_type, [shared])
+    if webgl:
+        fig.layout.template.layout.map = _map_view(geojson, row_height)
+    else:
+        fig.layout.template.layout.geo.update(
+            fitbounds="geojson", visible=False, projection_type="mercator"
+        )
+
+    traces, subplots, titles = [], {}, []
+    for n, metric in enumerate(metrics):
+        row, col = divmod(n, columns)
+        name = f"{subplot}{n + 1}" if n else subplot
+        top = 1 - row / rows
+        subplots[name] = dict(domain=dict(
+            x=[col / columns + gap, (col + 1) / columns - gap],
+            y=[top - 1 / rows + gap, top - 0.12 / rows],
+        ))
+        titles.append(dict(
+            text=metric.capitalize(), x=(col + 0.5) / columns, y=top,
+            xref="paper", yref="paper", xanchor="center", yanchor="top",
+            showarrow=False, font_size=12,
+        ))
+        traces.append({
+            "type": trace_type,
+            "z": table.ratios[metric].tolist(),
+            "customdata": table.values[[metric]].to_numpy().tolist(),
+            ("subplot" if webgl else "geo"): name,
+        })
+    fig.add_traces(traces)
+
+    fig.update_layout(
+        height=rows * row_height,
+        margin={"r": 0, "t": 10, "l": 0, "b": 0},
+        annotations=titles,
+        **subplots,
+        **_color_layout()
+    )
+    fig.update_layout(coloraxis_colorbar=dict(x=1.0, xanchor="right", len=0.4))
+    return fig
@@ -0,0 +1,255 @@
+"""Offline simplification of the map geometries.
+
+Polygons are broken into arcs at the points where borders meet, every arc is
+simplified once with Douglas-Peucker and the rings are rebuilt from the
+simplified arcs, so neighbouring governorates keep exactly the same border.
+Coordinates are then rounded to the precision of the level.
+
+    python geo_simplify.py                    # build every level into the store
+    python geo_simplify.py governorates low
+"""
+import json
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+import cache_backend
+import geo_store
+import telemetry
+
+# tolerance in degrees, output precision in decimals
+LEVELS = {
+    "high": (0.0005, 5),
+    "medium": (0.002, 4),
+    "low": (0.008, 3),
+}
+
+# Grid used to detect shared vertices (about 0.1 m)
+_GRID = 1e6
+
+
+def _douglas_peucker(points, tolerance):
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    if n < 3:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, seg = pts[i], pts[i + 1:j]
+        d = pts[j] - a
+        length = np.hypot(d[0], d[1])
+        if length == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / length
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return pts[keep]
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def _open_ring(ring):
+    pts = [(round(x * _GRID), round(y * _GRID)) for x, y, *_ in ring]
+    if len(pts) > 1 and pts[0] == pts[-1]:
+        pts.pop()
+    # consecutive duplicates would look like junctions
+    return [p for i, p in enumerate(pts) if p != pts[i - 1]] or pts[:1]
+
+
+def _junctions(rings):
+    neighbours = defaultdict(set)
+    for ring in rings:
+        n = len(ring)
+        for i, p in enumerate(ring):
+            neighbours[p].add(frozenset((ring[i - 1], ring[(i + 1) % n])))
+    return {p for p, pairs in neighbours.items() if len(pairs) > 1}
+
+
+def _signed_area(points):
+    # shoelace formula: positive for counter-clockwise rings
+    pts = np.asarray(points, dtype=float)
+    x, y = pts[:, 0], pts[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _split(ring, junctions):
+    """Cut a ring into arcs between junctions (each arc keeps both ends)."""
+    cuts = [i for i, p in enumerate(ring) if p in junctions]
+    if not cuts:
+        # A ring touching nobody is one closed arc; start it at a stable point
+        # and orientation so identical rings share the same arc.
+        start = ring.index(min(ring))
+        ring = ring[start:] + ring[:start]
+        backward = [ring[0]] + ring[:0:-1]
+        return [min(ring, backward) + [ring[0]]]
+    ring = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [c - cuts[0] for c in cuts] + [len(ring)]
+    ring = ring + [ring[0]]
+    return [ring[a:b + 1] for a, b in zip(cuts, cuts[1:])]
+
+
+def simplify(geojson, tolerance, precision):
+    """Return a simplified copy of a FeatureCollection, borders kept shared."""
+    structure = []
+    rings = []
+    for feature in geojson["features"]:
+        polys = []
+        for poly in _polygons(feature["geometry"]):
+            polys.append([len(rings) + i for i in range(len(poly))])
+            rings.extend(_open_ring(r) for r in poly)
+        structure.append(polys)
+
+    junctions = _junctions(rings)
+    arcs = {}
+    scale = tolerance * _GRID
+
+    def simplified(arc):
+        key = tuple(arc)
+        reverse = tuple(reversed(arc))
+        canonical = min(key, reverse)
+        if canonical not in arcs:
+            out = _douglas_peucker(canonical, scale)
+            # never collapse a closed arc below a triangle
+            if canonical[0] == canonical[-1] and len(out) < 4:
+                out = np.asarray(canonical, dtype=float)
+            arcs[canonical] = out
+        out = arcs[canonical]
+        return out if canonical == key else out[::-1]
+
+    def rebuild(ring_id):
+        ring = rings[ring_id]
+        if len(ring) < 3:
+            return None
+        parts = [simplified(arc) for arc in _split(ring, junctions)]
+        coords = np.concatenate([parts[0]] + [p[1:] for p in parts[1:]]) / _GRID
+        coords = np.round(coords, precision)
+        out = [coords[0].tolist()]
+        for point in coords[1:].tolist():
+            if point != out[-1]:
+                out.append(point)
+        if len(out) < 4:
+            return None
+        # a ring without junctions is rebuilt from its canonical arc: keep
+        # the original winding, which d3-geo (plotly's SVG maps) relies on
+        if np.sign(_signed_area(out)) != np.sign(_signed_area(ring)):
+            out.reverse()
+        return out
+
+    features = []
+    for feature, polys in zip(geojson["features"], structure):
+        coordinates = []
+        for poly in polys:
+            outer = rebuild(poly[0])
+            if outer is None:
+                continue
+            coordinates.append([outer] + [r for r in map(rebuild, poly[1:]) if r is not None])
+        if not coordinates:
+            # keep tiny islands visible rather than dropping the region
+            coordinates = [[np.round(np.asarray(_polygons(feature["geometry"])[0][0], dtype=float)[:, :2],
+                                     precision).tolist()]]
+        if len(coordinates) == 1:
+            geometry = {"type": "Polygon", "coordinates": coordinates[0]}
+        else:
+            geometry = {"type": "MultiPolygon", "coordinates": coordinates}
+        features.append({"type": "Feature", "properties": feature["properties"], "geometry": geometry})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _shared_key(name, level):
+    # tied to the source geometry and the level parameters
+    return f"geo:{name}@{level}:{geo_store.digest(name)}:{LEVELS[level]}"
+
+
+def _build_level(base, name, level):
+    tolerance, precision = LEVELS[level]
+    raw = json.dumps(simplify(base, tolerance, precision), separators=(",", ":"), ensure_ascii=False)
+    raw = raw.encode("utf-8")
+    data = geo_store.put(f"{name}@{level}", raw, source=f"{name} simplifié ({level})", share=False,
+                         derived_from=geo_store.digest(name))
+    shared = cache_backend.shared()
+    if shared is not None:
+        shared.set(_shared_key(name, level), raw)
+    return raw, data
+
+
+def build(name="governorates", levels=None):
+    """Simplify the stored geometry and put every level into the store."""
+    base = geo_store.load(name)
+    sizes = {"full": len(json.dumps(base, separators=(",", ":")))}
+    for level in levels or LEVELS:
+        raw, _ = _build_level(base, name, level)
+        sizes[level] = len(raw)
+    return sizes
+
+
+def load_level(name="governorates", level="medium"):
+    """Return a simplified level, building it on first use or when the source changed.
+
+    A stored level is valid while it was built from the geometry currently
+    stored under `name`; only the small index is read to check it.
+    """
+    if level not in LEVELS:
+        return geo_store.load(name)
+    source = geo_store.digest(name)
+    if source is None:
+        # first run: store the source geometry (bundled, shared or fetched)
+        geo_store.load(name)
+        source = geo_store.digest(name)
+    stored = f"{name}@{level}"
+    shared = cache_backend.shared()
+    data = geo_store.load_stored(stored) if geo_store.derived_from(stored) == source else None
+    if data is not None:
+        telemetry.count("geo_level", "hit")
+        if shared is not None and shared.get(_shared_key(name, level)) is None:
+            shared.set(_shared_key(name, level), geo_store.stored_bytes(stored))
+        return data
+
+    raw = shared.get(_shared_key(name, level)) if shared is not None else None
+    if raw is not None:
+        telemetry.count("geo_level", "shared")
+        return geo_store.put(stored, raw, source="cache partagé", share=False, derived_from=source)
+    telemetry.count("geo_level", "miss")
+    return _build_level(geo_store.load(name), name, level)[1]
+
+
+def pick_level(name="governorates", viewport_px=650):
+    """Coarsest level whose tolerance stays under half a pixel of the viewport."""
+    forced = os.environ.get("GENESMART_GEO_LEVEL")
+    if forced:
+        return forced
+    bbox = geo_store.bbox(name)
+    if bbox is None:
+        return "medium"
+    extent = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    budget = extent / viewport_px / 2
+    fitting = [level for level, (tolerance, _) in LEVELS.items() if tolerance <= budget]
+    return max(fitting, key=lambda level: LEVELS[level][0]) if fitting else "high"
+
+
+def main(argv):
+    name = argv[0] if argv else "governorates"
+    sizes = build(name, argv[1:] or None)
+    for level, size in sizes.items():
+        label = name if level == "full" else f"{name}@{level}"
+        print(f"{label}: {size / 1024:.1f} KiB (x{sizes['full'] / size:.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
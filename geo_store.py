@@ -0,0 +1,273 @@
+"""Persistent, content-addressed store for the map geometries.
+
+Geometries are fetched once (or imported from a bundled file), written to
+disk under the SHA-256 of their bytes and served from disk afterwards, so a
+fresh server process never has to hit the network.
+
+    python geo_store.py fetch                 # download into the store
+    python geo_store.py import governorates.geojson
+    python geo_store.py import delegations.geojson delegations
+    python geo_store.py verify
+"""
+import hashlib
+import json
+import os
+import sys
+
+import cache_backend
+import telemetry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files shipped with the app (e.g. for air-gapped nodes) live in geo/
+BUNDLED_DIR = os.path.join(BASE_DIR, "geo")
+STORE_DIR = os.environ.get("GENESMART_GEO_DIR", os.path.join(BASE_DIR, ".cache", "geo"))
+
+# Served by Streamlit's static file server (server.enableStaticServing) under
+# app/static/, with ETag revalidation. GENESMART_STATIC_DIR moves the files
+# elsewhere (benchmarks, which never serve them to a browser).
+STATIC_DIR = os.environ.get("GENESMART_STATIC_DIR", os.path.join(BASE_DIR, "static", "geo"))
+STATIC_URL = "app/static/geo"
+
+SOURCES = {
+    "governorates": {
+        "url": "https://raw.githubusercontent.com/mtimet/tnacmaps/master/geojson/governorates.geojson",
+        "key": "gov_name_f",
+    },
+    # Finer levels have no public source: ship them in geo/ or import them.
+    # Their features must also carry the key of the parent level.
+    "delegations": {
+        "url": None,
+        "key": "deleg_name",
+    },
+    "sectors": {
+        "url": None,
+        "key": "sec_name",
+    },
+}
+
+FETCH_TIMEOUT = 15
+
+
+def _offline():
+    return os.environ.get("GENESMART_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def _index_path():
+    return os.path.join(STORE_DIR, "index.json")
+
+
+def _object_path(digest):
+    return os.path.join(STORE_DIR, "objects", f"{digest}.geojson")
+
+
+def _read_index():
+    try:
+        with open(_index_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _key(name):
+    # Derived geometries ("governorates@low") share the key of their source
+    return SOURCES[name.split("@")[0]]["key"]
+
+
+def bounds(data):
+    """[min_lon, min_lat, max_lon, max_lat] of a FeatureCollection."""
+    xs, ys = [], []
+    for feature in data["features"]:
+        geometry = feature["geometry"]
+        polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+        for polygon in polygons:
+            for x, y, *_ in polygon[0]:
+                xs.append(x)
+                ys.append(y)
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def validate(data, key):
+    """Raise ValueError unless `data` is a usable FeatureCollection."""
+    if not isinstance(data, dict) or data.get("type") != "FeatureCollection":
+        raise ValueError("GeoJSON invalide : FeatureCollection attendue")
+    features = data.get("features")
+    if not features:
+        raise ValueError("GeoJSON invalide : aucune entité")
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"GeoJSON invalide : géométrie {geometry.get('type')!r}")
+        if not (feature.get("properties") or {}).get(key):
+            raise ValueError(f"GeoJSON invalide : propriété '{key}' manquante")
+    return data
+
+
+def put(name, raw, source=None, share=True, derived_from=None):
+    """Validate raw GeoJSON bytes and store them under their content hash.
+
+    With a shared cache configured, the bytes are also published there for
+    the other server processes (see cache_backend.py). `derived_from` is the
+    hash of the geometry a derived one ("governorates@low") was built from.
+    """
+    data = validate(json.loads(raw), _key(name))
+    sha = hashlib.sha256(raw).hexdigest()
+    path = _object_path(sha)
+    if not os.path.exists(path):
+        _atomic_write(path, raw)
+
+    index = _read_index()
+    index[name] = {
+        "sha256": sha,
+        "source": source,
+        "features": len(data["features"]),
+        "bbox": bounds(data),
+    }
+    if derived_from:
+        index[name]["derived_from"] = derived_from
+    _atomic_write(_index_path(), json.dumps(index, indent=2).encode("utf-8"))
+
+    shared = cache_backend.shared()
+    if share and shared is not None:
+        shared.set(f"geo:{name}", raw)
+    return data
+
+
+def load_stored(name):
+    """Return a stored geometry after checking its hash, or None."""
+    entry = _read_index().get(name)
+    if not entry:
+        return None
+    path = _object_path(entry["sha256"])
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    # A truncated or edited object is dropped and re-populated by the caller
+    if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+        os.remove(path)
+        return None
+    try:
+        return validate(json.loads(raw), _key(name))
+    except ValueError:
+        os.remove(path)
+        return None
+
+
+def _fetch(name):
+    url = SOURCES[name]["url"]
+    if not url:
+        raise FileNotFoundError(f"GeoJSON '{name}' absent : importez-le avec 'python geo_store.py import'")
+    # only needed on the very first run: not imported at startup
+    import requests
+
+    response = requests.get(url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+def load(name="governorates"):
+    """Return the parsed GeoJSON, from the store, the bundled file or the network."""
+    shared = cache_backend.shared()
+    data = load_stored(name)
+    if data is not None:
+        telemetry.count("geo_store", "hit")
+        if shared is not None and shared.get(f"geo:{name}") is None:
+            shared.set(f"geo:{name}", stored_bytes(name))
+        return data
+
+    # another replica may already have it
+    raw = shared.get(f"geo:{name}") if shared is not None else None
+    if raw is not None:
+        telemetry.count("geo_store", "shared")
+        return put(name, raw, source="cache partagé", share=False)
+
+    telemetry.count("geo_store", "miss")
+    bundled = os.path.join(BUNDLED_DIR, f"{name}.geojson")
+    if os.path.exists(bundled):
+        with open(bundled, "rb") as f:
+            return put(name, f.read(), source=bundled)
+
+    if _offline():
+        raise FileNotFoundError(f"GeoJSON '{name}' absent du cache local (mode hors ligne)")
+    return put(name, _fetch(name), source=SOURCES[name]["url"])
+
+
+def available(name):
+    """Whether `name` can be loaded without failing (stored, bundled or fetchable)."""
+    return (
+        name in _read_index()
+        or os.path.exists(os.path.join(BUNDLED_DIR, f"{name}.geojson"))
+        or (bool(SOURCES[name]["url"]) and not _offline())
+    )
+
+
+def stored_bytes(name):
+    """Bytes of a stored geometry."""
+    with open(_object_path(digest(name)), "rb") as f:
+        return f.read()
+
+
+def digest(name="governorates"):
+    """Content hash of the stored geometry, or None if it is not stored yet."""
+    entry = _read_index().get(name)
+    return entry["sha256"] if entry else None
+
+
+def derived_from(name):
+    """Hash of the geometry a stored derived geometry was built from, or None."""
+    entry = _read_index().get(name)
+    return entry.get("derived_from") if entry else None
+
+
+def bbox(name="governorates"):
+    """[min_lon, min_lat, max_lon, max_lat] of the stored geometry, or None."""
+    entry = _read_index().get(name)
+    return entry.get("bbox") if entry else None
+
+
+def publish(data):
+    """Expose a FeatureCollection as a static file and return its URL.
+
+    The file name is the hash of its content, so the URL never changes for
+    the same geometry: the browser downloads it once and revalidates it with
+    its ETag afterwards, and plotly.js keeps it in memory for the page.
+    """
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    name = f"{hashlib.sha256(raw).hexdigest()[:32]}.geojson"
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        _atomic_write(path, raw)
+    return f"{STATIC_URL}/{name}"
+
+
+def main(argv):
+    if not argv or argv[0] not in ("fetch", "import", "verify"):
+        print(__doc__)
+        return 2
+
+    command = argv[0]
+    name = argv[2] if command == "import" and len(argv) > 2 else "governorates"
+    if command == "fetch":
+        put(name, _fetch(name), source=SOURCES[name]["url"])
+    elif command == "import":
+        with open(argv[1], "rb") as f:
+            put(name, f.read(), source=os.path.abspath(argv[1]))
+    elif load_stored(name) is None:
+        print(f"{name}: absent ou corrompu")
+        return 1
+    print(f"{name}: {digest(name)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,77 @@
+"""Administrative levels of the map: governorate -> delegation -> sector.
+
+Scores are kept at the finest level present in the score file (optional
+"Délégation" and "Secteur" columns next to "Location") and rolled up to the
+level on screen. Finer geometries are loaded lazily, only when the user
+drills into a region, and must carry the key of their parent region.
+"""
+from collections import namedtuple
+
+import pandas as pd
+
+import geo_store
+import names
+
+# column: column of the score file naming the region at this level
+Level = namedtuple("Level", ["name", "label", "column"])
+
+LEVELS = [
+    Level("governorates", "Gouvernorats", "Location"),
+    Level("delegations", "Délégations", "Délégation"),
+    Level("sectors", "Secteurs", "Secteur"),
+]
+
+HIERARCHY = [level.column for level in LEVELS]
+
+
+def key(level):
+    """GeoJSON property naming the regions of `level`."""
+    return geo_store.SOURCES[level.name]["key"]
+
+
+def parent_key(depth):
+    return key(LEVELS[depth - 1]) if depth else None
+
+
+def can_drill(depth, columns=None):
+    """True when the next level has a geometry (and, given the columns of the
+    score file, scores at that level)."""
+    if depth + 1 >= len(LEVELS):
+        return False
+    if columns is not None and LEVELS[depth + 1].column not in columns:
+        return False
+    return geo_store.available(LEVELS[depth + 1].name)
+
+
+def has_children(finest, path):
+    """True when the score file has rows below the region at the end of `path`."""
+    return len(path) < len(LEVELS) and not rollup(finest, len(path), path).empty
+
+
+def subset(geojson, depth, parent):
+    """Features of the regions inside `parent` (all of them at the top level)."""
+    if not depth:
+        return geojson
+    prop = parent_key(depth)
+    parents = names.fold(pd.Series([f["properties"].get(prop, "") for f in geojson["features"]]))
+    inside = (parents == names.fold_one(parent)).to_numpy()
+    features = [f for f, keep in zip(geojson["features"], inside) if keep]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def rollup(finest, depth, path=()):
+    """Scores summed at `depth`, restricted to the regions under `path`.
+
+    The returned frame names the regions in a "Location" column like the
+    governorate table, so the rest of the pipeline is level-agnostic.
+    """
+    df = finest
+    for level, parent in zip(LEVELS, path):
+        df = df[names.fold(df[level.column]) == names.fold_one(parent)]
+    column = LEVELS[depth].column
+    if column not in df.columns:
+        return df.iloc[0:0][["Location"]]
+    df = df[df[column] != ""]
+    metrics = [c for c in df.columns if c not in HIERARCHY]
+    grouped = df.groupby(column)[metrics].sum().reset_index()
+    return grouped.rename(columns={column: "Location"})
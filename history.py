@@ -0,0 +1,113 @@
+"""Score history: one Parquet partition per period.
+
+    history/period=2026-01/scores.parquet
+    history/period=2026-02/scores.parquet
+
+Each partition holds the grouped scores of one period (same columns as the
+compiled score file). Range queries go through pyarrow.dataset, so only the
+partitions in the range and the requested columns are read.
+
+    python history.py add 2026-01 dataheatmap.csv
+    python history.py list
+"""
+import os
+import re
+import sys
+
+import ingest
+import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: the dashboard works without history
+    pa = None
+
+PERIOD_RE = re.compile(r"^\d{4}-\d{2}$")
+FILE_NAME = "scores.parquet"
+
+
+def _partition(period, root):
+    return os.path.join(root, f"period={period}")
+
+
+def periods(root=settings.HISTORY_DIR):
+    """Sorted periods available, from the directory names only."""
+    if pa is None or not os.path.isdir(root):
+        return []
+    found = []
+    for entry in os.listdir(root):
+        period = entry.partition("=")[2]
+        if entry.startswith("period=") and PERIOD_RE.match(period):
+            if os.path.exists(os.path.join(root, entry, FILE_NAME)):
+                found.append(period)
+    return sorted(found)
+
+
+def partition_version(period, root=settings.HISTORY_DIR):
+    stat = os.stat(os.path.join(_partition(period, root), FILE_NAME))
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def add_snapshot(df, period, root=settings.HISTORY_DIR):
+    """Write (or replace) the partition of `period` ("YYYY-MM")."""
+    if not PERIOD_RE.match(period):
+        raise ValueError(f"Période invalide : {period!r} (format AAAA-MM)")
+    table = pa.Table.from_pandas(df, schema=ingest.schema(df), preserve_index=False)
+    directory = _partition(period, root)
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{FILE_NAME}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, os.path.join(directory, FILE_NAME))
+
+
+def read_range(start, end, columns, root=settings.HISTORY_DIR):
+    """Scores of the periods in [start, end], with a "period" column.
+
+    The period filter prunes partitions and `columns` is pushed down to the
+    Parquet reader, so nothing else is loaded.
+    """
+    import pyarrow.dataset as ds  # only for the animation: not at startup
+
+    dataset = ds.dataset(root, format="parquet", partitioning="hive",
+                         exclude_invalid_files=True)
+    period = ds.field("period")
+    # Reagents come and go between periods: the dataset otherwise takes the
+    # schema of its first partition, and missing columns read as nulls
+    fragments = list(dataset.get_fragments(filter=(period >= start) & (period <= end)))
+    schema = pa.unify_schemas(
+        [dataset.schema] + [fragment.physical_schema for fragment in fragments]
+    )
+    for column in columns:
+        if column not in schema.names:
+            # a reagent newer than every snapshot of the range
+            schema = schema.append(pa.field(column, pa.float64()))
+    dataset = ds.dataset([fragment.path for fragment in fragments], schema=schema,
+                         format="parquet", partitioning="hive",
+                         partition_base_dir=root)
+    table = dataset.to_table(
+        columns=["period", *columns],
+        filter=(period >= start) & (period <= end),
+    )
+    return table.to_pandas()
+
+
+def read_period(period, root=settings.HISTORY_DIR):
+    return pq.read_table(os.path.join(_partition(period, root), FILE_NAME)).to_pandas()
+
+
+def main(argv):
+    if argv[:1] == ["list"]:
+        for period in periods():
+            print(period)
+        return 0
+    if len(argv) >= 2 and argv[0] == "add":
+        add_snapshot(ingest.read_csv(argv[2] if len(argv) > 2 else settings.DATA_PATH), argv[1])
+        print(f"{argv[1]}: ajouté")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
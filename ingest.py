@@ -0,0 +1,169 @@
+"""Score file ingestion.
+
+The CSV export is normalized and grouped once and compiled to a columnar file
+(Arrow IPC, memory-mapped on load, or Parquet) with an explicit schema. The
+app reads the compiled file when it matches the CSV and falls back to parsing
+the CSV otherwise.
+
+    python ingest.py                          # dataheatmap.csv -> dataheatmap.arrow
+    python ingest.py scores.csv scores.parquet
+"""
+import os
+import sys
+
+import pandas as pd
+
+import geography
+import names
+import pipeline
+import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: the CSV path works without it
+    pa = None
+
+COMPILED_SUFFIXES = (".arrow", ".parquet")
+FORMAT_VERSION = "2"
+
+
+def parse_rows(source, columns=None):
+    """Rows of a "SCORE FINAL" export (or of a headerless batch of them)."""
+    if columns is None:
+        df = pd.read_csv(source, skiprows=1)
+        df.columns = [c.strip() for c in df.columns]
+    else:
+        df = pd.read_csv(source, header=None, names=columns)
+
+    # Name Normalization (vectorized); matching to the GeoJSON keys happens in
+    # pipeline.build_map_table through names.match
+    df['Location'] = names.clean(df['Location'])
+    # Optional finer levels; "" marks rows known at a coarser level only
+    for column in geography.HIERARCHY[1:]:
+        if column in df.columns:
+            df[column] = names.clean(df[column].fillna("").astype(str))
+    return df
+
+
+def hierarchy(df):
+    return [c for c in geography.HIERARCHY if c in df.columns]
+
+
+def group_rows(df):
+    # Group by Location (and finer levels when present) and sum
+    return df.groupby(hierarchy(df)).sum().reset_index()
+
+
+def rollup(df):
+    """Governorate-level table of a finer grouped table."""
+    if hierarchy(df) == ["Location"]:
+        return df
+    return df.drop(columns=hierarchy(df)[1:]).groupby("Location").sum().reset_index()
+
+
+def read_csv(path):
+    """Parse the "SCORE FINAL" export into one row per Location (finest level)."""
+    return group_rows(parse_rows(path))
+
+
+def schema(df, source_digest=None):
+    fields = [pa.field("Location", pa.string(), nullable=False)]
+    fields += [pa.field(c, pa.string()) for c in hierarchy(df)[1:]]
+    fields += [pa.field(c, pa.float64()) for c in df.columns if c not in geography.HIERARCHY]
+    metadata = {"genesmart.format": FORMAT_VERSION}
+    if source_digest:
+        metadata["genesmart.source_sha256"] = source_digest
+    return pa.schema(fields, metadata=metadata)
+
+
+def compile_scores(csv_path, out_path):
+    """Write the grouped table of `csv_path` to an Arrow IPC or Parquet file."""
+    if pa is None:
+        raise ImportError("pyarrow est requis pour compiler les données")
+    df = read_csv(csv_path)
+    table = pa.Table.from_pandas(df, schema=schema(df, pipeline.file_digest(csv_path)), preserve_index=False)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    if out_path.endswith(".parquet"):
+        pq.write_table(table, tmp)
+    else:
+        # uncompressed so it can be memory-mapped
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, out_path)
+    return table
+
+
+def read_compiled(path):
+    if path.endswith(".parquet"):
+        table = pq.read_table(path, memory_map=True)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    return table
+
+
+def to_ipc(df):
+    """Arrow IPC stream bytes of a grouped table (shared cache format)."""
+    table = pa.Table.from_pandas(df, schema=schema(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def from_ipc(raw):
+    return pa.ipc.open_stream(raw).read_all().to_pandas()
+
+
+def compiled_paths(csv_path):
+    stem = os.path.splitext(csv_path)[0]
+    return [stem + suffix for suffix in COMPILED_SUFFIXES]
+
+
+def _schema_of(path):
+    if path.endswith(".parquet"):
+        return pq.read_schema(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def current_compiled(csv_path, suffixes=COMPILED_SUFFIXES):
+    """Compiled file matching the CSV (or standing in for a missing CSV), if any.
+
+    Only the schema metadata is read to decide.
+    """
+    if pa is None:
+        return None
+    csv_digest = pipeline.file_digest(csv_path) if os.path.exists(csv_path) else None
+    for path in compiled_paths(csv_path):
+        if not path.endswith(suffixes) or not os.path.exists(path):
+            continue
+        metadata = _schema_of(path).metadata or {}
+        if metadata.get(b"genesmart.format", b"").decode() != FORMAT_VERSION:
+            continue
+        source = metadata.get(b"genesmart.source_sha256", b"").decode()
+        # a compiled file without its CSV is the production setup
+        if csv_digest is None or source == csv_digest:
+            return path
+    return None
+
+
+def load(csv_path=settings.DATA_PATH):
+    """Grouped scores, from the compiled file when it is up to date."""
+    path = current_compiled(csv_path)
+    if path is not None:
+        return read_compiled(path).to_pandas()
+    return read_csv(csv_path)
+
+
+def main(argv):
+    csv_path = argv[0] if argv else settings.DATA_PATH
+    out_path = argv[1] if len(argv) > 1 else compiled_paths(csv_path)[0]
+    table = compile_scores(csv_path, out_path)
+    print(f"{out_path}: {table.num_rows} régions, {table.num_columns - 1} métriques")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
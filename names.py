@@ -0,0 +1,67 @@
+"""Vectorized region name normalization and matching to the GeoJSON keys.
+
+Names are folded (Unicode NFKD without accents, lower case, punctuation and
+leading articles dropped) so "Gabès", "GABES" and "gabes " all land on the
+same key, then looked up in an alias index built once from the GeoJSON.
+"""
+import pandas as pd
+
+# Transliteration variants seen in exports, folded -> folded canonical
+ALIASES = {
+    "banzart": "bizerte",
+    "bizerta": "bizerte",
+    "qabis": "gabes",
+    "qebili": "kebili",
+    "kbili": "kebili",
+    "mednine": "medenine",
+    "qairouan": "kairouan",
+    "kairawan": "kairouan",
+    "kasrine": "kasserine",
+    "safaqis": "sfax",
+    "nabul": "nabeul",
+    "susa": "sousse",
+    "silyanah": "siliana",
+    "tataouin": "tataouine",
+    "touzeur": "tozeur",
+    "zaghwan": "zaghouan",
+    "jundubah": "jendouba",
+    "manubah": "manouba",
+    "mannouba": "manouba",
+}
+
+
+def clean(names):
+    """Light cleanup kept in the data: trim, NFC and single spaces."""
+    return names.str.normalize("NFC").str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+def fold(names):
+    """Matching key of every name (vectorized over a Series)."""
+    folded = (
+        names.astype("string")
+        .str.normalize("NFKD")
+        .str.replace("[\u0300-\u036f]", "", regex=True)
+        .str.lower()
+        .str.replace(r"[-'’_.]", " ", regex=True)
+        .str.replace(r"^(?:le|la|l|el)\s+", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return folded.replace(ALIASES)
+
+
+def fold_one(name):
+    return fold(pd.Series([name]))[0]
+
+
+def alias_index(canonical):
+    """Folded name -> canonical GeoJSON key."""
+    canonical = pd.Series(list(canonical), dtype="string")
+    return dict(zip(fold(canonical), canonical))
+
+
+def match(names, index):
+    """Canonical key of every name (NA when unknown) and the unmatched names."""
+    matched = fold(names).map(index)
+    unmatched = names[matched.isna() & names.notna()].unique().tolist()
+    return matched, unmatched
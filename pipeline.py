@@ -0,0 +1,83 @@
+"""Data preparation shared by the dashboard, independent of Streamlit."""
+import hashlib
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+import names
+
+GEO_KEY = "gov_name_f"
+
+# values / ratios: one row per GeoJSON region, one column per metric.
+# means / totals: national statistics per metric (regions with data only).
+# unmatched: data locations that match no GeoJSON region.
+MapTable = namedtuple("MapTable", ["values", "ratios", "means", "totals", "unmatched"])
+
+
+_digests = {}
+
+
+def file_digest(path):
+    """SHA-256 of a file, recomputed only when its size or mtime changes."""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _digests.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, "rb") as f:
+            cached = (stamp, hashlib.sha256(f.read()).hexdigest())
+        _digests[path] = cached
+    return cached[1]
+
+
+def region_names(geojson, key=GEO_KEY):
+    return [f["properties"][key] for f in geojson["features"]]
+
+
+def build_map_table(df, geojson, key=GEO_KEY):
+    """Precompute the map-ready columns of every metric in one pass."""
+    regions = region_names(geojson, key)
+
+    # Spelling variants ("Gabes", "GABÈS") are mapped to the GeoJSON key and
+    # summed with it; names matching no region are kept as they are
+    canonical, unmatched = names.match(df["Location"], names.alias_index(regions))
+    data = df.select_dtypes("number")
+    data = data.groupby(canonical.fillna(df["Location"]).to_numpy()).sum()
+    means = data.mean()
+    totals = data.sum()
+
+    # Left join on the full country: regions without data get 0 and the -1
+    # ratio marker, which the color scale shows in gray.
+    locations = pd.Index(regions, name="Location")
+    values = data.reindex(locations)
+    ratios = values.div(means).fillna(-1)
+    return MapTable(values.fillna(0), ratios, means, totals, unmatched)
+
+
+def update_map_table(table, df, geojson, metrics, key=GEO_KEY):
+    """Recompute the columns of `metrics` only, keeping the other metrics."""
+    metrics = [m for m in metrics if m in df.columns]
+    fresh = build_map_table(df[["Location", *metrics]], geojson, key)
+    kept = [m for m in table.values.columns if m in df.columns and m not in metrics]
+    return MapTable(
+        pd.concat([table.values[kept], fresh.values], axis=1),
+        pd.concat([table.ratios[kept], fresh.ratios], axis=1),
+        pd.concat([table.means[kept], fresh.means]),
+        pd.concat([table.totals[kept], fresh.totals]),
+        fresh.unmatched,
+    )
+
+
+def map_source(table):
+    """Regions of the table that have data, as a Location + metrics frame."""
+    has_data = (table.ratios >= 0).any(axis=1)
+    return table.values[has_data].reset_index()
+
+
+def map_frame(table, metric):
+    """Frame expected by the choropleth for one metric (column lookups only)."""
+    return pd.DataFrame({
+        "Location": table.values.index,
+        metric: table.values[metric].to_numpy(),
+        "ratio_to_avg": table.ratios[metric].to_numpy(),
+    })
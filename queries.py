@@ -0,0 +1,114 @@
+"""Aggregations behind "Classement des Régions" and the insights.
+
+Two engines answer the same queries. The pandas engine works on the table
+already in memory. The DuckDB engine (optional, GENESMART_ENGINE=duckdb) runs
+them as SQL over the compiled Parquet file or the history partitions: the
+period filter is pushed down to the partitions and only the Location and
+metric columns are read, so a metric view touches a single column however
+many rows and reagents the score files hold.
+"""
+import os
+import threading
+
+import settings
+
+
+def _duckdb():
+    # optional, and only imported when the engine is selected
+    try:
+        import duckdb
+    except ImportError:  # the pandas engine is always available
+        return None
+    return duckdb
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+class PandasQueries:
+    engine = "pandas"
+
+    def __init__(self, df):
+        self.df = df
+
+    def by_region(self, metric):
+        """Location and `metric` summed per region."""
+        return self.df.groupby("Location", as_index=False)[metric].sum()
+
+    def count(self):
+        return self.df["Location"].nunique()
+
+    def top(self, metric, k, offset=0):
+        """Rows offset..offset+k of the ranking; selects, does not sort everything."""
+        return self.by_region(metric).nlargest(offset + k, metric).iloc[offset:]
+
+    def bottom(self, metric, k):
+        return self.by_region(metric).nsmallest(k, metric)
+
+
+class DuckDBQueries:
+    engine = "duckdb"
+
+    def __init__(self, relation, where=None, df=None):
+        # relation: SQL table expression, e.g. read_parquet('scores.parquet')
+        self._connection = _duckdb().connect()
+        self._df = df
+        self._relation = relation
+        self._where = f"WHERE {where}" if where else ""
+        self._local = threading.local()
+
+    def _cursor(self):
+        # DuckDB connections are not shared between threads (Streamlit sessions)
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._connection.cursor()
+            if self._df is not None:
+                # registered frames are scanned in place, per cursor
+                cursor.register("scores", self._df)
+        return cursor
+
+    def _by_region_sql(self, metric):
+        column = _quote(metric)
+        return (f'SELECT "Location", SUM({column}) AS {column} FROM {self._relation} '
+                f'{self._where} GROUP BY "Location"')
+
+    def by_region(self, metric):
+        return self._cursor().execute(self._by_region_sql(metric)).df()
+
+    def count(self):
+        sql = f'SELECT COUNT(DISTINCT "Location") FROM {self._relation} {self._where}'
+        return self._cursor().execute(sql).fetchone()[0]
+
+    def top(self, metric, k, offset=0):
+        # ORDER BY ... LIMIT runs as a top-N operator, not a full sort
+        sql = (f"{self._by_region_sql(metric)} ORDER BY {_quote(metric)} DESC "
+               f"LIMIT {int(k)} OFFSET {int(offset)}")
+        return self._cursor().execute(sql).df()
+
+    def bottom(self, metric, k):
+        sql = f"{self._by_region_sql(metric)} ORDER BY {_quote(metric)} ASC LIMIT {int(k)}"
+        return self._cursor().execute(sql).df()
+
+
+def open_queries(df, parquet=None, period=None, history_dir=settings.HISTORY_DIR):
+    """Queries over `df`, or over its Parquet source with the DuckDB engine.
+
+    `parquet` is a compiled score file equivalent to `df`; `period` selects a
+    history partition instead.
+    """
+    if settings.QUERY_ENGINE != "duckdb" or _duckdb() is None:
+        return PandasQueries(df)
+    if period is not None:
+        files = os.path.join(history_dir, "*", "*.parquet")
+        return DuckDBQueries(
+            f"read_parquet({_literal(files)}, hive_partitioning = true, union_by_name = true)",
+            where=f"period = {_literal(period)}",
+        )
+    if parquet is not None:
+        return DuckDBQueries(f"read_parquet({_literal(parquet)})")
+    return DuckDBQueries("scores", df=df)
@@ -0,0 +1,80 @@
+"""Per-metric rank index of the governorate scores.
+
+Built once per data change over the regions of the governorate map table
+(the map's names, spelling variants merged): every metric holds its regions
+sorted by decreasing value and the inverse permutation, so the leader, the
+laggard, a page of the ranking and the rank or percentile of a region are
+lookups instead of a sort on every rerun. After a change, only the metrics
+whose column changed are sorted again.
+
+The index answers count / top / bottom like the query engines of queries.py,
+so the ranking panel uses either one.
+"""
+import numpy as np
+import pandas as pd
+
+import geography
+import names
+
+
+class RankIndex:
+    engine = "index"
+
+    def __init__(self, grouped, previous=None, changed=None):
+        """Index of `grouped` (Location + metrics, one row per region).
+
+        With `previous` and the set of `changed` metrics, the other metrics
+        reuse the previous index when the regions are the same.
+        """
+        self.locations = grouped["Location"].to_numpy()
+        self._rows = dict(zip(names.fold(grouped["Location"]), range(len(grouped))))
+        reuse = (
+            previous is not None and changed is not None
+            and np.array_equal(previous.locations, self.locations)
+        )
+        self._values, self._order, self._positions = {}, {}, {}
+        for metric in grouped.columns:
+            if metric in geography.HIERARCHY:
+                continue
+            if reuse and metric not in changed and metric in previous._order:
+                self._values[metric] = previous._values[metric]
+                self._order[metric] = previous._order[metric]
+                self._positions[metric] = previous._positions[metric]
+                continue
+            values = grouped[metric].to_numpy(dtype=float)
+            # stable: ties keep the file order, like nlargest(keep="first")
+            order = np.argsort(-values, kind="stable")
+            positions = np.empty_like(order)
+            positions[order] = np.arange(len(order))
+            self._values[metric] = values
+            self._order[metric] = order
+            self._positions[metric] = positions
+
+    def _frame(self, metric, rows):
+        return pd.DataFrame({
+            "Location": self.locations[rows],
+            metric: self._values[metric][rows],
+        })
+
+    def count(self):
+        return len(self.locations)
+
+    def top(self, metric, k, offset=0):
+        """Rows offset..offset+k of the ranking."""
+        return self._frame(metric, self._order[metric][offset:offset + k])
+
+    def bottom(self, metric, k):
+        return self._frame(metric, self._order[metric][::-1][:k])
+
+    def position(self, metric, name):
+        """1-based rank of the region `name` (any spelling), or None."""
+        row = self._rows.get(names.fold_one(name))
+        return None if row is None else int(self._positions[metric][row]) + 1
+
+    def percentile(self, metric, name):
+        """Share of the other regions ranked below `name`, in percent."""
+        position = self.position(metric, name)
+        if position is None:
+            return None
+        n = self.count()
+        return 100.0 if n < 2 else 100.0 * (n - position) / (n - 1)
@@ -0,0 +1,184 @@
+"""Grouped scores kept in sync with the score file on disk.
+
+`refresh()` is cheap enough to call on every rerun: it only stats the file.
+When rows were appended, only the new bytes are parsed and added to the group
+sums; any other edit triggers a full parse. Each metric carries a version
+that changes only when its column (at the finest level of the file) changes,
+so caches keyed on it (map tables of every level, figures) are invalidated
+for the affected metrics only.
+
+The data is published as one immutable Snapshot, swapped in a single
+assignment: a rerun takes `store.snapshot` once and never sees the tables of
+one version with the versions of another while another session refreshes.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+import cache_backend
+import ingest
+import telemetry
+
+
+# finest: sums per region at the finest level of the file; grouped: the same
+# rolled up to governorates; metric_versions: {metric: version of its column};
+# version: bumped on every change (see ScoreStore.changed_since)
+Snapshot = namedtuple("Snapshot", ["finest", "grouped", "metric_versions", "version"])
+
+
+def _region_digest(finest):
+    # Regions of the finest level: drilled views depend on them, not only
+    # on the governorate sums
+    h = hashlib.sha256()
+    for column in ingest.hierarchy(finest):
+        h.update(finest[column].to_numpy().astype(str).tobytes())
+    return h.digest()
+
+
+def _column_version(regions, finest, metric):
+    h = hashlib.sha256(regions)
+    h.update(finest[metric].to_numpy(dtype=float).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _metrics(finest):
+    return [m for m in finest.columns if m not in ingest.hierarchy(finest)]
+
+
+class ScoreStore:
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = Snapshot(None, None, {}, 0)
+        self._stamp = None
+        self._size = 0
+        self._digest = None
+        self._columns = None
+        self._history = {}
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        if os.path.exists(self.path):
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        # Compiled-only deployment: watch the Arrow/Parquet file instead
+        stamps = []
+        for path in ingest.compiled_paths(self.path):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def refresh(self):
+        """Bring the grouped table up to date; return the set of changed metrics."""
+        stamp = self._stat()
+        if stamp == self._stamp:
+            telemetry.count("scores", "hit")
+            return set()
+        with self._lock:
+            if stamp == self._stamp:
+                telemetry.count("scores", "hit")
+                return set()
+            if not os.path.exists(self.path):
+                telemetry.count("scores", "miss")
+                changed = self._replace(ingest.load(self.path))
+            else:
+                changed = self._read_csv()
+            self._stamp = stamp
+            return changed
+
+    def _read_csv(self):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        old_size = self._size
+        appended = (
+            self.snapshot.finest is not None
+            and len(raw) > old_size
+            and raw[old_size - 1:old_size] == b"\n"
+            and hashlib.sha256(raw[:old_size]).hexdigest() == self._digest
+        )
+        self._size = len(raw)
+        self._digest = hashlib.sha256(raw).hexdigest()
+        if appended:
+            telemetry.count("scores", "append")
+            batch = ingest.parse_rows(io.BytesIO(raw[old_size:]), self._columns)
+            changed = self._append(ingest.group_rows(batch))
+            self._share()
+            return changed
+        self._columns = list(pd.read_csv(io.BytesIO(raw), skiprows=1, nrows=0).columns.str.strip())
+
+        # Another server process may have parsed this exact file already
+        shared = cache_backend.shared()
+        cached = shared.get(self._shared_key()) if shared is not None and ingest.pa else None
+        if cached is not None:
+            telemetry.count("scores", "shared")
+            return self._replace(ingest.from_ipc(cached))
+        telemetry.count("scores", "miss")
+        if self.snapshot.finest is None:
+            # first load may use the compiled file if it matches the CSV
+            grouped = ingest.load(self.path)
+        else:
+            grouped = ingest.read_csv(self.path)
+        changed = self._replace(grouped)
+        self._share()
+        return changed
+
+    def _shared_key(self):
+        return f"scores:{ingest.FORMAT_VERSION}:{self._digest}"
+
+    def _share(self):
+        shared = cache_backend.shared()
+        if shared is not None and ingest.pa:
+            shared.set(self._shared_key(), ingest.to_ipc(self.snapshot.finest))
+
+    def _replace(self, finest):
+        old = self.snapshot.metric_versions
+        regions = _region_digest(finest)
+        versions = {m: _column_version(regions, finest, m) for m in _metrics(finest)}
+        changed = {m for m, v in versions.items() if old.get(m) != v}
+        return self._publish(finest, versions, changed)
+
+    def _append(self, batch):
+        current = self.snapshot
+        keys = ingest.hierarchy(current.finest)
+        finest = current.finest.set_index(keys)
+        batch = batch.set_index(keys)
+        new_regions = batch.index.difference(finest.index)
+
+        # A new region (at any level) changes every mean of its view;
+        # otherwise only the metrics the batch actually adds to
+        if len(new_regions):
+            metrics = set(finest.columns)
+        else:
+            metrics = set(batch.columns[(batch != 0).any()])
+
+        existing = batch.index.intersection(finest.index)
+        finest.loc[existing] += batch.loc[existing]
+        if len(new_regions):
+            finest = pd.concat([finest, batch.loc[new_regions]]).sort_index()
+        finest = finest.reset_index()
+
+        versions = dict(current.metric_versions)
+        regions = _region_digest(finest)
+        for m in metrics:
+            versions[m] = _column_version(regions, finest, m)
+        return self._publish(finest, versions, metrics)
+
+    def _publish(self, finest, versions, metrics):
+        # the history entry first: a reader holding the new snapshot can
+        # always ask what changed up to it
+        version = self.snapshot.version + 1
+        self._history[version] = frozenset(metrics)
+        self.snapshot = Snapshot(finest, ingest.rollup(finest), versions, version)
+        return metrics
+
+    def changed_since(self, version, until=None):
+        """Metrics changed after `version` up to `until` (the current version
+        by default), or None if that is not known."""
+        until = self.snapshot.version if until is None else until
+        if version < 1 or version > until or any(v not in self._history for v in range(version + 1, until + 1)):
+            return None
+        return set().union(*(self._history[v] for v in range(version + 1, until + 1)))
@@ -0,0 +1,56 @@
+"""Dashboard settings shared by the app and the offline tools."""
+import os
+
+# Sidebar grouping of the reagents (metric columns of the score file)
+CATEGORIES = {
+    "🧬 Pré-analytique": ["extraction adn", "cfdna", "zymo"],
+    "🧪 Réactifs de base": ["amorces pcr", "réactifs pcr", "taq polymerase"],
+    "🔬 PCR routinière": ["kit pcr", "qpcr", "rt-pcr"],
+    "🛰️ PCR avancée": ["pcr digital"],
+    "🩺 Applications cliniques": ["hla b51", "pylori"]
+}
+
+DATA_PATH = os.environ.get("GENESMART_DATA_PATH", "dataheatmap.csv")
+
+# Monthly score snapshots (see history.py)
+HISTORY_DIR = os.environ.get("GENESMART_HISTORY_DIR", "history")
+
+# "pandas" or "duckdb" for the ranking queries (see queries.py)
+QUERY_ENGINE = os.environ.get("GENESMART_ENGINE", "pandas")
+
+DEFAULT_METRIC = "extraction adn"
+
+MAP_HEIGHT = 650
+
+# Height of a row of small maps in the all-metrics view
+GRID_ROW_HEIGHT = 260
+
+# Rows of the region ranking sent per page ("Afficher plus" adds a page)
+RANKING_PAGE = 25
+
+# Reference the geometry by URL (static file cached by the browser) instead of
+# embedding it in every figure; needs server.enableStaticServing
+GEOMETRY_BY_URL = os.environ.get("GENESMART_GEOMETRY_BY_URL", "1") != "0"
+
+# Serialized figures shared by all sessions (see figure_cache.py)
+FIGURE_CACHE_BYTES = int(os.environ.get("GENESMART_FIGURE_CACHE_BYTES", 64 * 1024 * 1024))
+FIGURE_CACHE_DIR = os.environ.get("GENESMART_FIGURE_CACHE_DIR") or None
+
+# Build every metric's figure in the background at startup (see warmup.py)
+WARMUP = os.environ.get("GENESMART_WARMUP", "1") != "0"
+
+# Cache shared by all server processes / replicas (see cache_backend.py)
+CACHE_URL = os.environ.get("GENESMART_CACHE_URL") or None
+CACHE_TTL = int(os.environ.get("GENESMART_CACHE_TTL", "0")) or None
+# Size cap of a disk cache (disk:// URL or GENESMART_FIGURE_CACHE_DIR)
+CACHE_DISK_BYTES = int(os.environ.get("GENESMART_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+
+# Timings and cache counters (see telemetry.py)
+DIAGNOSTICS = os.environ.get("GENESMART_DIAGNOSTICS") == "1"
+TELEMETRY_LOG = os.environ.get("GENESMART_TELEMETRY_LOG") or None
+METRICS_FILE = os.environ.get("GENESMART_METRICS_FILE") or None
+METRICS_PORT = int(os.environ.get("GENESMART_METRICS_PORT", "0")) or None
+
+
+def all_metrics():
+    return [m for metrics in CATEGORIES.values() for m in metrics]
@@ -0,0 +1,105 @@
+"""Regions with a similar reagent profile.
+
+Each region is the vector of its metrics divided by each metric's average
+(the ratios the map is colored with), so metrics with large counts do not
+outweigh the others. Two distances: "cosine" compares the shape of the
+profiles, "euclidean" their shape and level.
+
+Up to PAIRWISE_MAX regions, every pairwise distance is computed once and a
+query is a row lookup. Beyond, queries go through a nearest-neighbour index:
+scikit-learn's when it is installed, else a vectorized scan of the matrix
+(one matrix-vector product per query).
+"""
+import numpy as np
+import pandas as pd
+
+import geography
+import names
+
+DISTANCES = ("cosine", "euclidean")
+
+# Largest pairwise matrix kept in memory (float32: 16 MB at 2000 regions)
+PAIRWISE_MAX = 2000
+
+
+def _neighbors_class():
+    # optional, and only imported for large views
+    try:
+        from sklearn.neighbors import NearestNeighbors
+    except ImportError:  # the numpy scan is always available
+        return None
+    return NearestNeighbors
+
+
+def profiles(grouped):
+    """Region x metric matrix of `grouped`, as ratios to each metric's average."""
+    metrics = [c for c in grouped.columns if c != "Location" and c not in geography.HIERARCHY]
+    matrix = grouped[metrics].to_numpy(dtype=float)
+    means = matrix.mean(axis=0) if len(matrix) else np.ones(len(metrics))
+    return matrix / np.where(means > 0, means, 1.0)
+
+
+def _distances(matrix, rows, distance):
+    """Distances from `rows` of the matrix to every row (len(rows) x N)."""
+    products = matrix[rows] @ matrix.T
+    if distance == "cosine":
+        # rows are unit vectors (see SimilarityIndex)
+        return 1.0 - products
+    squares = (matrix ** 2).sum(axis=1)
+    return np.sqrt(np.maximum(squares[rows, None] + squares[None, :] - 2 * products, 0.0))
+
+
+class SimilarityIndex:
+    def __init__(self, grouped, distance="cosine", pairwise_max=PAIRWISE_MAX):
+        if distance not in DISTANCES:
+            raise ValueError(f"Distance inconnue : {distance}")
+        self.distance = distance
+        self.locations = grouped["Location"].to_numpy()
+        self._rows = dict(zip(names.fold(grouped["Location"]), range(len(grouped))))
+        matrix = profiles(grouped)
+        if distance == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms > 0, norms, 1.0)
+        self._matrix = matrix
+        self._pairwise = self._tree = None
+        if len(matrix) <= pairwise_max:
+            self.engine = "pairwise"
+            self._pairwise = _distances(matrix, slice(None), distance).astype(np.float32)
+        else:
+            NearestNeighbors = _neighbors_class()
+            self.engine = "numpy" if NearestNeighbors is None else "sklearn"
+            if NearestNeighbors is not None:
+                # on unit vectors, cosine distance = euclidean distance² / 2
+                self._tree = NearestNeighbors().fit(matrix)
+
+    def count(self):
+        return len(self.locations)
+
+    def neighbors(self, name, k):
+        """The `k` regions closest to `name` (any spelling), nearest first.
+
+        A frame of Location and Distance, or None if `name` is not a region
+        of the index.
+        """
+        row = self._rows.get(names.fold_one(name))
+        if row is None:
+            return None
+        k = max(min(k, self.count() - 1), 0)
+        if self._tree is not None:
+            found, rows = self._tree.kneighbors(self._matrix[row:row + 1], n_neighbors=k + 1)
+            found, rows = found[0], rows[0]
+            if self.distance == "cosine":
+                found = found ** 2 / 2
+        else:
+            if self._pairwise is not None:
+                found = self._pairwise[row]
+            else:
+                found = _distances(self._matrix, [row], self.distance)[0]
+            rows = np.argpartition(found, k)[:k + 1]
+            rows = rows[np.argsort(found[rows], kind="stable")]
+            found = found[rows]
+        others = rows != row
+        return pd.DataFrame({
+            "Location": self.locations[rows[others]][:k],
+            "Distance": found[others][:k].astype(float),
+        })
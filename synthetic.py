@@ -0,0 +1,181 @@
+"""Synthetic score files and geometries at production scale.
+
+    python synthetic.py out/ --regions 10000 --metrics 200
+    python synthetic.py out/ --regions 500 --duplicates 0.3 --missing 0.05 --variants 0.2
+
+writes out/dataheatmap.csv (two-line "SCORE FINAL" header, Location column,
+one column per metric) and out/governorates.geojson, a grid of polygons whose
+neighbours share their borders exactly, keyed like the governorates. Run the
+app on them with:
+
+    python geo_store.py import out/governorates.geojson governorates
+    GENESMART_DATA_PATH=out/dataheatmap.csv streamlit run app.py
+
+The rows exercise the ingestion path like real exports do: regions split over
+several rows (summed by the grouping), regions of the map without any row
+(gray on the map) and names written with accent, case, spacing or hyphen
+variants (folded back by names.match). Everything is seeded.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import settings
+
+# Approximate bounds of Tunisia, so map views look like the real one
+BOUNDS = (7.5, 30.2, 11.6, 37.5)
+
+# Distinct once folded, so every combination is a distinct region
+FIRST = ["Aïn", "Béja", "Bir", "Chébika", "Djérba", "Gabès", "Hammam", "Kébili",
+         "Ksar", "Médenine", "Menzel", "Métlaoui", "Oued", "Sidi", "Tébourba", "Zarzis"]
+SECOND = ["Bas", "Centre", "Est", "Haut", "Jébel", "Médina", "Nord", "Ouest",
+          "Plage", "Sud", "Ville", "Zaouïa"]
+
+
+def region_names(count):
+    names = []
+    combos = len(FIRST) * len(SECOND)
+    for n in range(count):
+        first, second = divmod(n % combos, len(SECOND))
+        name = f"{FIRST[first]} {SECOND[second]}"
+        names.append(f"{name} {n // combos + 1}" if n >= combos else name)
+    return names
+
+
+def metric_names(count):
+    """The dashboard's own metrics first, then generated reagents."""
+    known = settings.all_metrics()[:count]
+    return known + [f"réactif {n:04d}" for n in range(len(known), count)]
+
+
+def _strip_accents(name):
+    return "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+
+
+VARIANTS = [
+    _strip_accents,
+    str.upper,
+    lambda name: f" {name.replace(' ', '  ')} ",
+    lambda name: name.replace(" ", "-"),
+]
+
+
+def scores(regions, metrics, duplicates=0.1, missing=0.02, variants=0.1, seed=0):
+    """Rows of a score export and the grouped table they should produce.
+
+    `duplicates`, `missing` and `variants` are fractions of the regions split
+    over 2-3 rows, left without rows, and written with a spelling variant.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(region_names(regions), dtype=object)
+    columns = metric_names(metrics)
+    values = rng.uniform(0.1, 0.35, size=(regions, metrics)).round(2)
+
+    present = rng.random(regions) >= missing
+    names, values = names[present], values[present]
+    expected = pd.DataFrame(values, columns=columns)
+    expected.insert(0, "Location", names)
+
+    # Split some regions over several rows; the parts add up to the values
+    parts = np.where(rng.random(len(names)) < duplicates, rng.integers(2, 4, len(names)), 1)
+    rows = np.repeat(np.arange(len(names)), parts)
+    starts = np.r_[0, np.cumsum(parts)[:-1]]
+    weights = rng.random((len(rows), metrics))
+    weights /= np.add.reduceat(weights, starts)[rows]
+    split = (values[rows] * weights).round(4)
+    # rounding leftovers go to the first row of each region
+    split[starts] += values - np.add.reduceat(split, starts)
+
+    written = names[rows].copy()
+    varied = rng.random(len(rows)) < variants
+    picks = rng.integers(0, len(VARIANTS), len(rows))
+    for i in np.flatnonzero(varied):
+        written[i] = VARIANTS[picks[i]](written[i])
+
+    df = pd.DataFrame(split.round(4), columns=columns)
+    df.insert(0, "Location", written)
+    order = rng.permutation(len(df))
+    return df.iloc[order].reset_index(drop=True), expected
+
+
+def write_scores(path, df):
+    """Write rows in the export format read by ingest.parse_rows."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",SCORE FINAL" + "," * (len(df.columns) - 2) + "\n")
+        df.to_csv(f, index=False)
+
+
+def geojson(names, key=pipeline.GEO_KEY, points_per_side=6, seed=0):
+    """Grid of jagged cells, one per name, sharing their borders exactly."""
+    west, south, east, north = BOUNDS
+    cols = math.ceil(math.sqrt(len(names) * (east - west) / (north - south)))
+    rows = math.ceil(len(names) / cols)
+    k = points_per_side
+    rng = np.random.default_rng(seed)
+    # one jittered lattice: neighbours read the same points on their border
+    jitter = rng.uniform(-0.3, 0.3, size=(rows * k + 1, cols * k + 1, 2))
+    dx, dy = (east - west) / (cols * k), (north - south) / (rows * k)
+
+    def point(i, j):
+        return [round(west + (j + jitter[i, j, 0]) * dx, 5),
+                round(south + (i + jitter[i, j, 1]) * dy, 5)]
+
+    features = []
+    for n, name in enumerate(names):
+        r, c = divmod(n, cols)
+        i0, j0 = r * k, c * k
+        ring = [point(i0, j0 + s) for s in range(k)]
+        ring += [point(i0 + s, j0 + k) for s in range(k)]
+        ring += [point(i0 + k, j0 + k - s) for s in range(k)]
+        ring += [point(i0 + k - s, j0) for s in range(k)]
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "properties": {key: name},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def generate(directory, regions, metrics, duplicates=0.1, missing=0.02, variants=0.1,
+             with_geojson=True, seed=0):
+    """Write the score file (and geometry) of a dataset; return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rows, _ = scores(regions, metrics, duplicates, missing, variants, seed)
+    paths = {"scores": os.path.join(directory, "dataheatmap.csv")}
+    write_scores(paths["scores"], rows)
+    if with_geojson:
+        paths["geojson"] = os.path.join(directory, "governorates.geojson")
+        with open(paths["geojson"], "w", encoding="utf-8") as f:
+            json.dump(geojson(region_names(regions), seed=seed), f, separators=(",", ":"),
+                      ensure_ascii=False)
+    return paths
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python synthetic.py")
+    parser.add_argument("directory")
+    parser.add_argument("--regions", type=int, default=1000)
+    parser.add_argument("--metrics", type=int, default=len(settings.all_metrics()))
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--missing", type=float, default=0.02)
+    parser.add_argument("--variants", type=float, default=0.1)
+    parser.add_argument("--no-geojson", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = generate(args.directory, args.regions, args.metrics, args.duplicates, args.missing,
+                     args.variants, not args.no_geojson, args.seed)
+    for path in paths.values():
+        print(f"{path}: {os.path.getsize(path) / 1024:.0f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
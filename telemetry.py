@@ -0,0 +1,209 @@
+"""Stage timings and cache counters of the dashboard.
+
+Timers wrap the hot path of a rerun (data load, map table, figure build and
+serialization, st.plotly_chart...). Each script run keeps its own timings,
+shown by the diagnostics panel (GENESMART_DIAGNOSTICS=1 or ?diagnostics=1)
+and written as one JSON line per rerun to GENESMART_TELEMETRY_LOG. Process
+totals and the hit/miss counters of every cache are exposed in the Prometheus
+text format, written to GENESMART_METRICS_FILE and/or served on
+http://localhost:$GENESMART_METRICS_PORT/metrics.
+
+Recording is a few dictionary updates, cheap enough to stay on in production.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import settings
+
+# Upper bounds (seconds) of the stage duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Minimum interval between two writes of the metrics file
+FILE_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_stages = {}                 # stage -> [count, sum, cumulative bucket counts]
+_caches = defaultdict(int)   # (cache, result) -> count
+_run = threading.local()     # timings of the script run of this thread
+_written = 0.0
+
+
+def begin_run():
+    _run.started = time.perf_counter()
+    _run.timings = []
+    _run.caches = []
+
+
+def elapsed():
+    started = getattr(_run, "started", None)
+    return time.perf_counter() - started if started is not None else 0.0
+
+
+def run_timings():
+    """(stage, seconds) recorded by the current script run, in order."""
+    return list(getattr(_run, "timings", []))
+
+
+def run_caches():
+    """(cache, result) recorded by the current script run, in order."""
+    return list(getattr(_run, "caches", []))
+
+
+def record(stage, seconds):
+    timings = getattr(_run, "timings", None)
+    if timings is not None:
+        timings.append((stage, seconds))
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = [0, 0.0, [0] * len(BUCKETS)]
+        entry[0] += 1
+        entry[1] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[2][i] += 1
+
+
+@contextlib.contextmanager
+def timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def count(cache, result):
+    """Count a lookup of `cache`: "hit", "miss" or a cache-specific outcome."""
+    caches = getattr(_run, "caches", None)
+    if caches is not None:
+        caches.append((cache, result))
+    with _lock:
+        _caches[(cache, result)] += 1
+
+
+def cache_counts():
+    """{cache: {result: count}} since the process started."""
+    with _lock:
+        counts = defaultdict(dict)
+        for (cache, result), n in _caches.items():
+            counts[cache][result] = n
+    return dict(counts)
+
+
+def counted(name, cache):
+    """Decorator applying a Streamlit cache decorator and counting its hits.
+
+        @telemetry.counted("geojson", st.cache_data)
+
+    The function body only runs on a miss, which is what tells them apart.
+    """
+    def decorate(fn):
+        local = threading.local()
+
+        @functools.wraps(fn)
+        def body(*args, **kwargs):
+            local.missed = True
+            return fn(*args, **kwargs)
+
+        cached = cache(body)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            local.missed = False
+            result = cached(*args, **kwargs)
+            count(name, "miss" if local.missed else "hit")
+            return result
+
+        call.clear = cached.clear
+        return call
+    return decorate
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus():
+    """Process totals in the Prometheus text exposition format."""
+    with _lock:
+        stages = {stage: (n, total, list(buckets)) for stage, (n, total, buckets) in _stages.items()}
+        caches = dict(_caches)
+    lines = ["# HELP genesmart_stage_seconds Duration of the dashboard stages.",
+             "# TYPE genesmart_stage_seconds histogram"]
+    for stage, (n, total, buckets) in sorted(stages.items()):
+        stage = _label(stage)
+        for bound, c in zip(BUCKETS, buckets):
+            lines.append(f'genesmart_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {c}')
+        lines.append(f'genesmart_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {n}')
+        lines.append(f'genesmart_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'genesmart_stage_seconds_count{{stage="{stage}"}} {n}')
+    lines += ["# HELP genesmart_cache_lookups_total Cache lookups by outcome.",
+              "# TYPE genesmart_cache_lookups_total counter"]
+    for (cache, result), n in sorted(caches.items()):
+        lines.append(f'genesmart_cache_lookups_total{{cache="{_label(cache)}",result="{_label(result)}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+
+def _write_metrics_file(path):
+    global _written
+    now = time.monotonic()
+    if now - _written < FILE_INTERVAL:
+        return
+    _written = now
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus())
+    os.replace(tmp, path)
+
+
+def end_run(**fields):
+    """Close the current script run: record its total and emit it.
+
+    `fields` (metric, level, session...) are added to the JSON log line.
+    """
+    total = elapsed()
+    record("rerun", total)
+    if settings.TELEMETRY_LOG:
+        line = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pid": os.getpid(),
+            **fields,
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {stage: round(s * 1000, 2) for stage, s in run_timings()},
+            "caches": [f"{cache}:{result}" for cache, result in run_caches()],
+        }
+        with open(settings.TELEMETRY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    if settings.METRICS_FILE:
+        _write_metrics_file(settings.METRICS_FILE)
+    return total
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics on `port` from a background thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="genesmart-metrics", daemon=True).start()
+    return server
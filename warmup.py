@@ -0,0 +1,111 @@
+"""Fill every cache before the first visitor arrives.
+
+    python warmup.py                          # deploy step, before `streamlit run`
+
+The command fills the caches that outlive the process: the compiled score
+file, the geometry store with its simplified levels and static copies, and the
+serialized figures of every metric when a shared cache is configured
+(GENESMART_CACHE_URL or GENESMART_FIGURE_CACHE_DIR). app.py runs the same
+`warm()` once per server process, in the background, for its in-memory caches.
+"""
+import sys
+import time
+
+import figure_cache
+import figures
+import geo_simplify
+import geo_store
+import geography
+import ingest
+import pipeline
+import score_store
+import settings
+
+MODES = ("single", "switch")
+
+
+def _default_table(store, snapshot, geojson, level):
+    return pipeline.build_map_table(snapshot.grouped, geojson, geography.key(geography.LEVELS[0]))
+
+
+def warm(store, cache, load_table=_default_table, metrics=None, modes=MODES, log=None):
+    """Load the data and geometry of the governorate map and build its figures.
+
+    `load_table(store, snapshot, geojson, level)` returns the map table (the app passes
+    its own so the table is shared); figures are built through
+    `cache.get_or_build` with the keys the app uses, so they end up as hits.
+    Returns the number of figures built.
+    """
+    log = log or (lambda message: None)
+    started = time.perf_counter()
+
+    store.refresh()
+    # one snapshot for the table and the figure keys (see score_store.py)
+    snapshot = store.snapshot
+    log(f"données : {len(snapshot.grouped)} régions, version {snapshot.version}")
+
+    geo_name = geography.LEVELS[0].name
+    geo_store.load(geo_name)
+    # the level depends on the stored bounds, like in the app
+    geo_level = geo_simplify.pick_level(geo_name, settings.MAP_HEIGHT)
+    geojson = geography.subset(geo_simplify.load_level(geo_name, geo_level), 0, None)
+    geo_source = geo_store.publish(geojson) if settings.GEOMETRY_BY_URL else None
+    geo_digest = geo_store.digest(f"{geo_name}@{geo_level}")
+    log(f"géométrie : {geo_name}@{geo_level}, {len(geojson['features'])} régions")
+
+    table = load_table(store, snapshot, geojson, geo_level)
+    key = geography.key(geography.LEVELS[0])
+    backend = figures.pick_backend(geojson)
+    all_metrics = [m for m in settings.all_metrics() if m in table.values]
+    # the default metric first: it is what the next visitor sees
+    wanted = sorted(metrics or all_metrics, key=lambda m: m != settings.DEFAULT_METRIC)
+
+    built = 0
+    for metric in wanted:
+        for mode in modes:
+            if mode == "switch":
+                versions = [snapshot.metric_versions.get(m) for m in all_metrics]
+
+                def build(metric=metric):
+                    return figures.build_switchable_choropleth(
+                        table, geojson, all_metrics, metric, settings.MAP_HEIGHT, key, backend,
+                        geo_source
+                    ).to_json()
+            else:
+                versions = snapshot.metric_versions.get(metric)
+
+                def build(metric=metric):
+                    return figures.build_choropleth(
+                        pipeline.map_frame(table, metric), metric, geojson, settings.MAP_HEIGHT,
+                        key, backend, geo_source
+                    ).to_json()
+
+            figure_key = figures.figure_key(
+                mode, metric, versions, geo_digest, (), settings.GEOMETRY_BY_URL,
+                settings.MAP_HEIGHT, backend,
+            )
+            if cache.get(figure_key) is None:
+                cache.get_or_build(figure_key, build)
+                built += 1
+    log(f"figures : {built} construites, {len(wanted) * len(modes) - built} déjà en cache "
+        f"({time.perf_counter() - started:.1f} s)")
+    return built
+
+
+def main(argv):
+    if ingest.pa is not None and ingest.current_compiled(settings.DATA_PATH) is None:
+        out_path = ingest.compiled_paths(settings.DATA_PATH)[0]
+        ingest.compile_scores(settings.DATA_PATH, out_path)
+        print(f"{out_path}: compilé")
+
+    backend = figure_cache.default_backend()
+    if backend is None:
+        print("figures : aucun cache partagé configuré (GENESMART_CACHE_URL), "
+              "elles seront construites au démarrage du serveur")
+    cache = figure_cache.FigureCache(settings.FIGURE_CACHE_BYTES, backend)
+    warm(score_store.ScoreStore(settings.DATA_PATH), cache, modes=MODES if backend else (), log=print)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))